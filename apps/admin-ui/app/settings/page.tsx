@@ -122,6 +122,43 @@ export default function SettingsPage() {
             <p className="text-sm text-gray-500 mt-1">Minimum shock score (0-100) to process a story</p>
           </div>
 
+          <div>
+            <label className="block text-sm font-medium text-gray-700 mb-2">
+              Classification Batch Size
+            </label>
+            <input
+              type="number"
+              name="classification_batch_size"
+              value={settings.classification_batch_size?.value || 1}
+              onChange={(e) => updateSetting('classification_batch_size', { value: parseInt(e.target.value) })}
+              onInput={(e) => updateSetting('classification_batch_size', { value: parseInt((e.target as HTMLInputElement).value) || 1 })}
+              onBlur={() => saveSetting('classification_batch_size', settings.classification_batch_size)}
+              data-testid="classification-batch-size-input"
+              className="px-3 py-2 border border-gray-300 rounded-md w-32"
+            />
+            <p className="text-sm text-gray-500 mt-1">Stories classified per AI request (1 disables batching)</p>
+          </div>
+
+          <div>
+            <label className="block text-sm font-medium text-gray-700 mb-2">
+              Pre-filter Threshold
+            </label>
+            <input
+              type="number"
+              step="0.01"
+              min="0"
+              max="1"
+              name="prefilter_threshold"
+              value={settings.prefilter_threshold?.value ?? 0.05}
+              onChange={(e) => updateSetting('prefilter_threshold', { value: parseFloat(e.target.value) })}
+              onInput={(e) => updateSetting('prefilter_threshold', { value: parseFloat((e.target as HTMLInputElement).value) || 0 })}
+              onBlur={() => saveSetting('prefilter_threshold', settings.prefilter_threshold)}
+              data-testid="prefilter-threshold-input"
+              className="px-3 py-2 border border-gray-300 rounded-md w-32"
+            />
+            <p className="text-sm text-gray-500 mt-1">Minimum local pre-filter score (0-1) before AI classification (0 disables)</p>
+          </div>
+
           <div>
             <label className="block text-sm font-medium text-gray-700 mb-2">
               Daily Video Cap
@@ -139,6 +176,22 @@ export default function SettingsPage() {
             <p className="text-sm text-gray-500 mt-1">Maximum videos to publish per day</p>
           </div>
 
+          <div>
+            <label className="block text-sm font-medium text-gray-700 mb-2">
+              Channel Timezone
+            </label>
+            <input
+              type="text"
+              name="channel_timezone"
+              value={settings.channel_timezone?.value ?? 'UTC'}
+              onChange={(e) => updateSetting('channel_timezone', { value: e.target.value })}
+              onBlur={() => saveSetting('channel_timezone', settings.channel_timezone)}
+              data-testid="channel-timezone-input"
+              className="px-3 py-2 border border-gray-300 rounded-md w-64"
+            />
+            <p className="text-sm text-gray-500 mt-1">IANA timezone the daily cap resets in (e.g. America/New_York)</p>
+          </div>
+
           <div>
             <label className="block text-sm font-medium text-gray-700 mb-2">
               YouTube Visibility
@@ -3,6 +3,7 @@ Orbix Network Worker
 Main entry point for the background worker system
 """
 import os
+import time
 import logging
 from dotenv import load_dotenv
 from apscheduler.schedulers.blocking import BlockingScheduler
@@ -15,7 +16,8 @@ from modules.review_manager import ReviewManager
 from modules.renderer import Renderer
 from modules.publisher import Publisher
 from modules.analytics import AnalyticsCollector
-from modules.database import Database
+from modules.services import Services
+from modules.pipeline import Pipeline
 
 # Load environment variables
 load_dotenv()
@@ -27,65 +29,81 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Long-lived clients shared by every job
+services = Services()
+
 
 def run_scraping_job():
     """Scrape news sources and store raw items"""
     logger.info("Starting scraping job")
     try:
-        scraper = Scraper()
-        scraper.run()
-        logger.info("Scraping job completed")
+        started = time.monotonic()
+        scraper = Scraper(db=services.db)
+        new_items = scraper.run()
+        logger.info(f"Scraping job completed in {time.monotonic() - started:.2f}s")
+        return new_items
     except Exception as e:
         logger.error(f"Scraping job failed: {e}", exc_info=True)
+        services.check_health('db')
+        return 0
 
 
 def run_classification_job():
     """Classify and score new raw items"""
     logger.info("Starting classification job")
     try:
-        classifier = Classifier()
-        classifier.process_new_items()
-        logger.info("Classification job completed")
+        started = time.monotonic()
+        classifier = Classifier(db=services.db, client=services.openai)
+        stories = classifier.process_new_items()
+        logger.info(f"Classification job completed in {time.monotonic() - started:.2f}s")
+        return stories
     except Exception as e:
         logger.error(f"Classification job failed: {e}", exc_info=True)
+        services.check_health('db', 'openai')
+        return 0
 
 
 def run_script_generation_job():
     """Generate scripts for approved stories"""
     logger.info("Starting script generation job")
     try:
-        generator = ScriptGenerator()
-        generator.process_queued_stories()
-        logger.info("Script generation job completed")
+        started = time.monotonic()
+        generator = ScriptGenerator(db=services.db, client=services.openai)
+        scripts = generator.process_queued_stories()
+        logger.info(f"Script generation job completed in {time.monotonic() - started:.2f}s")
+        return scripts
     except Exception as e:
         logger.error(f"Script generation job failed: {e}", exc_info=True)
+        services.check_health('db', 'openai')
+        return 0
 
 
 def run_review_check_job():
     """Check review queue for auto-approvals"""
     logger.info("Starting review check job")
     try:
-        review_manager = ReviewManager()
-        review_manager.check_auto_approvals()
-        logger.info("Review check job completed")
+        started = time.monotonic()
+        review_manager = ReviewManager(db=services.db)
+        approved = review_manager.check_auto_approvals()
+        logger.info(f"Review check job completed in {time.monotonic() - started:.2f}s")
+        return approved
     except Exception as e:
         logger.error(f"Review check job failed: {e}", exc_info=True)
+        services.check_health('db')
+        return 0
 
 
 def run_render_creation_job():
     """Create render records for approved scripts"""
     logger.info("Starting render creation job")
     try:
-        db = Database()
+        started = time.monotonic()
+        db = services.db
         scripts = db.get_approved_scripts_for_rendering()
         logger.info(f"Found {len(scripts)} approved scripts ready for rendering")
         
+        created = 0
         for script in scripts:
-            # Check if render already exists
-            existing = db.client.table('renders').select('id').eq('script_id', script['id']).execute()
-            if existing.data:
-                continue
-            
             # Create render record
             render = {
                 'story_id': script['story_id'],
@@ -97,53 +115,86 @@ def run_render_creation_job():
             }
             render_id = db.insert_render(render)
             if render_id:
+                created += 1
                 logger.info(f"Created render record: {render_id}")
         
-        logger.info("Render creation job completed")
+        logger.info(f"Render creation job completed in {time.monotonic() - started:.2f}s")
+        return created
     except Exception as e:
         logger.error(f"Render creation job failed: {e}", exc_info=True)
+        services.check_health('db')
+        return 0
 
 
 def run_rendering_job():
     """Render videos for approved scripts"""
     logger.info("Starting rendering job")
     try:
-        renderer = Renderer()
-        renderer.process_pending_renders()
-        logger.info("Rendering job completed")
+        started = time.monotonic()
+        renderer = Renderer(db=services.db)
+        completed = renderer.process_pending_renders()
+        logger.info(f"Rendering job completed in {time.monotonic() - started:.2f}s")
+        return completed
     except Exception as e:
         logger.error(f"Rendering job failed: {e}", exc_info=True)
+        services.check_health('db')
+        return 0
 
 
 def run_publishing_job():
     """Publish completed renders to platforms"""
     logger.info("Starting publishing job")
     try:
-        publisher = Publisher()
-        publisher.process_completed_renders()
-        logger.info("Publishing job completed")
+        started = time.monotonic()
+        publisher = Publisher(db=services.db, youtube_service=services.youtube)
+        published = publisher.process_completed_renders()
+        logger.info(f"Publishing job completed in {time.monotonic() - started:.2f}s")
+        return published
     except Exception as e:
         logger.error(f"Publishing job failed: {e}", exc_info=True)
+        services.check_health('db', 'youtube')
+        return 0
 
 
 def run_analytics_job():
     """Collect analytics for published videos"""
     logger.info("Starting analytics job")
     try:
-        collector = AnalyticsCollector()
+        started = time.monotonic()
+        collector = AnalyticsCollector(db=services.db, youtube_service=services.youtube)
         collector.collect_daily_metrics()
-        logger.info("Analytics job completed")
+        logger.info(f"Analytics job completed in {time.monotonic() - started:.2f}s")
     except Exception as e:
         logger.error(f"Analytics job failed: {e}", exc_info=True)
+        services.check_health('db', 'youtube')
 
 
 def main():
     """Main scheduler setup"""
     scheduler = BlockingScheduler()
     
+    # In event mode each stage triggers the next as soon as it produces work,
+    # and the downstream intervals only act as a fallback sweep
+    event_driven = os.getenv('PIPELINE_MODE', 'event') == 'event'
+    sweep_minutes = int(os.getenv('PIPELINE_SWEEP_MINUTES', '15'))
+    pipeline = Pipeline(scheduler, event_driven=event_driven)
+    
+    pipeline.add_stage('scraping', run_scraping_job, next_stage='classification')
+    pipeline.add_stage('classification', run_classification_job, next_stage='script_generation')
+    pipeline.add_stage('script_generation', run_script_generation_job, next_stage='render_creation')
+    pipeline.add_stage('review_check', run_review_check_job, next_stage='render_creation')
+    pipeline.add_stage('render_creation', run_render_creation_job, next_stage='rendering')
+    pipeline.add_stage('rendering', run_rendering_job, next_stage='publishing')
+    pipeline.add_stage('publishing', run_publishing_job)
+    
+    def interval(minutes: int) -> IntervalTrigger:
+        """Polling interval for a downstream stage"""
+        return IntervalTrigger(minutes=max(minutes, sweep_minutes) if event_driven else minutes)
+    
     # Scraping: every 5 minutes
     scheduler.add_job(
-        run_scraping_job,
+        pipeline.run,
+        args=['scraping'],
         trigger=IntervalTrigger(minutes=5),
         id='scraping',
         max_instances=1
@@ -151,23 +202,26 @@ def main():
     
     # Classification: every 2 minutes
     scheduler.add_job(
-        run_classification_job,
-        trigger=IntervalTrigger(minutes=2),
+        pipeline.run,
+        args=['classification'],
+        trigger=interval(2),
         id='classification',
         max_instances=1
     )
     
     # Script generation: every 3 minutes
     scheduler.add_job(
-        run_script_generation_job,
-        trigger=IntervalTrigger(minutes=3),
+        pipeline.run,
+        args=['script_generation'],
+        trigger=interval(3),
         id='script_generation',
         max_instances=1
     )
     
-    # Review check: every 1 minute
+    # Review check: every 1 minute (auto-approval is time based, so this always polls)
     scheduler.add_job(
-        run_review_check_job,
+        pipeline.run,
+        args=['review_check'],
         trigger=IntervalTrigger(minutes=1),
         id='review_check',
         max_instances=1
@@ -175,24 +229,27 @@ def main():
     
     # Render creation: every 3 minutes
     scheduler.add_job(
-        run_render_creation_job,
-        trigger=IntervalTrigger(minutes=3),
+        pipeline.run,
+        args=['render_creation'],
+        trigger=interval(3),
         id='render_creation',
         max_instances=1
     )
     
     # Rendering: every 5 minutes
     scheduler.add_job(
-        run_rendering_job,
-        trigger=IntervalTrigger(minutes=5),
+        pipeline.run,
+        args=['rendering'],
+        trigger=interval(5),
         id='rendering',
         max_instances=1
     )
     
     # Publishing: every 10 minutes
     scheduler.add_job(
-        run_publishing_job,
-        trigger=IntervalTrigger(minutes=10),
+        pipeline.run,
+        args=['publishing'],
+        trigger=interval(10),
         id='publishing',
         max_instances=1
     )
@@ -207,8 +264,16 @@ def main():
         max_instances=1
     )
     
+    # Client health: every 15 minutes, since stages log and skip failed API calls without failing the job
+    scheduler.add_job(
+        services.check_health,
+        trigger=IntervalTrigger(minutes=15),
+        id='health_check',
+        max_instances=1
+    )
+    
     logger.info("Orbix Network Worker started")
-    logger.info("Scheduler jobs configured")
+    logger.info(f"Scheduler jobs configured ({'event-driven' if event_driven else 'interval'} pipeline)")
     
     try:
         scheduler.start()
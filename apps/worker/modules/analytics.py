@@ -1,13 +1,11 @@
 """
 Analytics collection module
 """
-import os
 import logging
 from datetime import datetime, date, timedelta
-from typing import Dict, List
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from typing import Dict, List, Optional
 from modules.database import Database
+from modules.services import build_youtube_service
 
 logger = logging.getLogger(__name__)
 
@@ -15,33 +13,9 @@ logger = logging.getLogger(__name__)
 class AnalyticsCollector:
     """Collects analytics from published videos"""
     
-    def __init__(self):
-        self.db = Database()
-        self.youtube_service = self._get_youtube_service()
-    
-    def _get_youtube_service(self):
-        """Initialize YouTube API service"""
-        try:
-            client_id = os.getenv('YOUTUBE_CLIENT_ID')
-            client_secret = os.getenv('YOUTUBE_CLIENT_SECRET')
-            refresh_token = os.getenv('YOUTUBE_REFRESH_TOKEN')
-            
-            if not all([client_id, client_secret, refresh_token]):
-                logger.warning("YouTube credentials not configured")
-                return None
-            
-            creds = Credentials(
-                None,
-                refresh_token=refresh_token,
-                token_uri='https://oauth2.googleapis.com/token',
-                client_id=client_id,
-                client_secret=client_secret
-            )
-            
-            return build('youtube', 'v3', credentials=creds)
-        except Exception as e:
-            logger.error(f"Error initializing YouTube service: {e}")
-            return None
+    def __init__(self, db: Optional[Database] = None, youtube_service=None):
+        self.db = db or Database()
+        self.youtube_service = youtube_service or build_youtube_service()
     
     def collect_daily_metrics(self):
         """Collect daily analytics for all published videos"""
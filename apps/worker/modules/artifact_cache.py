@@ -0,0 +1,110 @@
+"""
+Local content-addressed cache of rendered videos
+"""
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class RenderArtifactCache:
+    """Keeps rendered MP4s on local disk, named by sha256, so the publisher can skip re-downloading them.
+    
+    The least recently used files are evicted once the directory grows past its size budget.
+    """
+    
+    CHUNK_BYTES = 1024 * 1024
+    DOWNLOAD_TIMEOUT_SECONDS = 300
+    
+    _lock = threading.Lock()
+    
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.cache_dir = Path(cache_dir or os.getenv('RENDER_ARTIFACT_CACHE_DIR')
+                              or Path(tempfile.gettempdir()) / 'orbix_render_artifacts')
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes or int(os.getenv('RENDER_ARTIFACT_CACHE_MAX_MB', '2048')) * 1024 * 1024
+    
+    def add(self, file_path: str) -> str:
+        """Move a file into the cache, returns its sha256"""
+        digest = self.checksum(file_path)
+        target = self.path(digest)
+        if target.exists():
+            os.remove(file_path)
+        else:
+            shutil.move(file_path, target)
+        self._evict(keep=target)
+        return digest
+    
+    def get(self, digest: Optional[str]) -> Optional[Path]:
+        """Get the cached file for a sha256, or None on a miss"""
+        if not digest:
+            return None
+        path = self.path(digest)
+        try:
+            # Mark as recently used for eviction
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+    
+    def fetch(self, url: str, digest: Optional[str] = None) -> Path:
+        """Stream a file from `url` straight to disk and cache it, verifying it against `digest` if given"""
+        fd, tmp_path = tempfile.mkstemp(suffix='.part', dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f, requests.get(url, stream=True, timeout=self.DOWNLOAD_TIMEOUT_SECONDS) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(chunk_size=self.CHUNK_BYTES):
+                    f.write(chunk)
+            
+            downloaded = self.add(tmp_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        
+        if digest and downloaded != digest:
+            os.remove(self.path(downloaded))
+            raise ValueError(f"Checksum mismatch for {url}: expected {digest}, got {downloaded}")
+        return self.path(downloaded)
+    
+    def checksum(self, file_path: str) -> str:
+        """Get the sha256 of a file, reading it in chunks"""
+        sha = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.CHUNK_BYTES), b''):
+                sha.update(chunk)
+        return sha.hexdigest()
+    
+    def path(self, digest: str) -> Path:
+        """Get where the file for a sha256 is (or would be) cached"""
+        return self.cache_dir / f"{digest}.mp4"
+    
+    def _evict(self, keep: Path):
+        """Remove least recently used files until the cache fits its budget"""
+        with RenderArtifactCache._lock:
+            files = []
+            for path in self.cache_dir.glob('*.mp4'):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+            
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                    total -= size
+                    logger.info(f"Evicted cached render {path.name}")
+                except FileNotFoundError:
+                    pass
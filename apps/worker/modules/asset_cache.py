@@ -0,0 +1,123 @@
+"""
+Render-ready cache of normalised background assets
+"""
+import hashlib
+import logging
+import os
+import subprocess
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundAssetCache:
+    """Pre-scales and pads each background to the output frame once, keyed by content hash.
+    
+    Stills become a 1080x1920 RGB PNG; motion clips become a 1080x1920 yuv420p MP4 at the
+    output frame rate. Renders then feed the intermediate straight to the overlay filters
+    instead of scaling and padding every frame. Editing a source asset changes its hash,
+    so it is rebuilt on next use and the stale intermediate is removed.
+    """
+    
+    WIDTH = 1080
+    HEIGHT = 1920
+    FPS = 30
+    PAD_COLOR = (0, 0, 0)
+    IMAGE_SUFFIXES = {'.png', '.jpg', '.jpeg', '.webp'}
+    PREPARE_TIMEOUT_SECONDS = 300
+    
+    # Source hashes memoised by (path, size, mtime) so unchanged assets aren't re-read every render
+    _hashes: Dict[Tuple[str, int, int], str] = {}
+    _locks: Dict[str, threading.Lock] = {}
+    _lock = threading.Lock()
+    
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = Path(cache_dir or os.getenv('RENDER_ASSET_CACHE_DIR')
+                              or Path(tempfile.gettempdir()) / 'orbix_render_assets')
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+    
+    def is_image(self, path: Path) -> bool:
+        return path.suffix.lower() in self.IMAGE_SUFFIXES
+    
+    def prepare(self, source: Path) -> Optional[Path]:
+        """Get the normalised intermediate for a background, building it if needed; None if it can't be built"""
+        try:
+            digest = self._content_hash(source)
+        except OSError as e:
+            logger.error(f"Error reading background {source}: {e}")
+            return None
+        
+        suffix = '.png' if self.is_image(source) else '.mp4'
+        target = self.cache_dir / f"{self._slug(source)}-{digest[:16]}-{self.WIDTH}x{self.HEIGHT}{suffix}"
+        if target.exists():
+            return target
+        
+        with self._lock_for(str(target)):
+            if target.exists():
+                return target
+            try:
+                self._build(source, target)
+            except Exception as e:
+                logger.error(f"Error preparing background {source}: {e}")
+                return None
+            self._remove_stale(source, target)
+        return target
+    
+    def _build(self, source: Path, target: Path):
+        """Write the intermediate to a temp file, then move it into place so readers never see a partial file"""
+        tmp_path = target.with_name(f".{target.name}.{os.getpid()}.{threading.get_ident()}.tmp{target.suffix}")
+        try:
+            if self.is_image(source):
+                with Image.open(source) as image:
+                    frame = ImageOps.pad(image.convert('RGB'), (self.WIDTH, self.HEIGHT), color=self.PAD_COLOR)
+                    frame.save(tmp_path, format='PNG')
+            else:
+                cmd = [
+                    'ffmpeg', '-y', '-i', str(source), '-an',
+                    '-vf', (f"scale={self.WIDTH}:{self.HEIGHT}:force_original_aspect_ratio=decrease,"
+                            f"pad={self.WIDTH}:{self.HEIGHT}:(ow-iw)/2:(oh-ih)/2,fps={self.FPS},format=yuv420p"),
+                    '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18', str(tmp_path)
+                ]
+                result = subprocess.run(cmd, capture_output=True, text=True, timeout=self.PREPARE_TIMEOUT_SECONDS)
+                if result.returncode != 0:
+                    raise RuntimeError(result.stderr[-2000:])
+            os.replace(tmp_path, target)
+            logger.info(f"Prepared background {source.name} -> {target.name}")
+        finally:
+            if tmp_path.exists():
+                os.remove(tmp_path)
+    
+    def _remove_stale(self, source: Path, current: Path):
+        """Remove intermediates built from older versions of the same source"""
+        for path in self.cache_dir.glob(f"{self._slug(source)}-*"):
+            if path != current and not path.name.startswith('.'):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+    
+    def _content_hash(self, source: Path) -> str:
+        """Get the sha256 of a source file, memoised while its size and mtime are unchanged"""
+        stat = source.stat()
+        key = (str(source), stat.st_size, stat.st_mtime_ns)
+        digest = BackgroundAssetCache._hashes.get(key)
+        if digest is None:
+            sha = hashlib.sha256()
+            with open(source, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    sha.update(chunk)
+            digest = sha.hexdigest()
+            BackgroundAssetCache._hashes[key] = digest
+        return digest
+    
+    def _slug(self, source: Path) -> str:
+        """Get a filesystem-safe name for a source asset"""
+        return ''.join(c if c.isalnum() else '_' for c in f"{source.parent.name}_{source.stem}")
+    
+    def _lock_for(self, key: str) -> threading.Lock:
+        with BackgroundAssetCache._lock:
+            return BackgroundAssetCache._locks.setdefault(key, threading.Lock())
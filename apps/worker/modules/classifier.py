@@ -1,12 +1,20 @@
 """
 AI Classification and Shock Scoring module
 """
-import os
+import re
+import hashlib
 import logging
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
 from typing import Dict, List, Optional
-from openai import OpenAI
+from openai import OpenAI, APIStatusError, APIConnectionError
 from modules.database import Database
+from modules.services import build_openai_client, openai_rate_limiter
+from modules.near_duplicates import NearDuplicateDetector
+from modules.prefilter import PreFilter
+from modules.rate_limiter import retry_with_jitter
 
 logger = logging.getLogger(__name__)
 
@@ -22,13 +30,56 @@ class Classifier:
         'Money & Market Shock'
     ]
     
-    def __init__(self):
-        self.db = Database()
-        api_key = os.getenv('OPENAI_API_KEY')
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY must be set")
-        self.client = OpenAI(api_key=api_key)
+    MODEL = 'gpt-4'
+    PROMPT_VERSION = 'v1'  # Bump when the classification prompt changes to invalidate cached verdicts
+    CACHE_TTL_HOURS = 72
+    
+    # Request pipeline limits
+    CONCURRENCY = 4
+    MAX_COMPLETION_TOKENS = 300  # Reserved per item when rate limiting on tokens
+    CLAIM_BATCH_SIZE = 1000  # NEW raw items leased per run
+    
+    BELOW_THRESHOLD_REASON = 'Failed classification or below threshold'
+    PREFILTER_REASON = 'Rejected by pre-filter'
+    PREFILTER_TRAINING_ITEMS = 5000
+    DUPLICATE_REASON = 'Near-duplicate of an existing story'
+    DUPLICATE_LOOKBACK_HOURS = 48
+    DUPLICATE_HISTORY_ITEMS = 2000
+    
+    # Shared across Classifier instances so the model is only retrained every PreFilter.RETRAIN_HOURS
+    _prefilter: Optional[PreFilter] = None
+    
+    RUBRIC = """Categories (choose exactly ONE):
+1. AI & Automation Takeovers
+2. Corporate Collapses & Reversals
+3. Tech Decisions With Massive Fallout
+4. Laws & Rules That Quietly Changed Everything
+5. Money & Market Shock
+
+Shock Score Components (total 0-100):
+- Scale (0-30): How many people/companies affected?
+- Speed (0-20): How quickly did this happen?
+- Power shift (0-25): How much did power/control change?
+- Permanence (0-15): How permanent is this change?
+- Explainability (0-10): How hard is this to explain to average person?
+
+Rules:
+- If story is unclear, political rage, graphic violence, or speculation-heavy, return "DISCARD"
+- If shock score is below 65, return "DISCARD"
+- Only return valid category if story clearly fits"""
+    
+    def __init__(self, db: Optional[Database] = None, client: Optional[OpenAI] = None):
+        self.db = db or Database()
+        # Retries are handled by _complete so they share the rate limiter
+        self.client = (client or build_openai_client()).with_options(max_retries=0)
+        # Shared with every OpenAI caller, so back-to-back or overlapping runs don't each get a full budget
+        self.rate_limiter = openai_rate_limiter()
         self.threshold = self._get_threshold()
+        self.batch_size = self._get_batch_size()
+        self.prefilter_threshold = self._get_prefilter_threshold()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._stats_lock = threading.Lock()
     
     def _get_threshold(self) -> int:
         """Get shock score threshold from settings"""
@@ -37,55 +88,291 @@ class Classifier:
             return setting.get('value', 65)
         return 65
     
-    def process_new_items(self):
-        """Process new raw items for classification"""
-        items = self.db.get_new_raw_items()
+    def _get_batch_size(self) -> int:
+        """Get how many items to classify per request from settings"""
+        setting = self.db.get_setting('classification_batch_size')
+        if setting and isinstance(setting, dict):
+            return max(1, int(setting.get('value', 1)))
+        return 1
+    
+    def _get_prefilter_threshold(self) -> float:
+        """Get the minimum pre-filter score (0-1) an item needs to reach AI classification, 0 disables"""
+        setting = self.db.get_setting('prefilter_threshold')
+        if setting and isinstance(setting, dict):
+            return float(setting.get('value', 0))
+        return 0.0
+    
+    def process_new_items(self) -> int:
+        """Process new raw items for classification, returns how many stories were created"""
+        items = self.db.claim_new_raw_items(self.CLAIM_BATCH_SIZE)
         logger.info(f"Processing {len(items)} new raw items")
+        if not items:
+            return 0
+        
+        # Items left NEW by a failure stay leased until the lease expires, then any worker retries them
+        with self.db.leased('raw_items', [item['id'] for item in items]):
+            return self._classify_claimed(items)
+    
+    def _classify_claimed(self, items: List[Dict]) -> int:
+        """Classify claimed raw items, returns how many stories were created"""
+        self._prune_cache()
+        items = self._apply_prefilter(items)
+        items = self._collapse_near_duplicates(items)
+        if not items:
+            return 0
+        
+        # LLM calls run concurrently; DB writes are batched afterwards on this thread
+        with ThreadPoolExecutor(max_workers=self.CONCURRENCY, thread_name_prefix='classifier') as executor:
+            if self.batch_size > 1:
+                batches = [items[i:i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+                results = [result for batch_results in executor.map(self._classify_batch, batches) for result in batch_results]
+            else:
+                results = list(executor.map(self._classify_item, items))
+        
+        created = self._save_results(items, results)
+        
+        lookups = self.cache_hits + self.cache_misses
+        if lookups:
+            logger.info(f"Classification cache: {self.cache_hits}/{lookups} hits ({self.cache_hits / lookups:.0%})")
+        return created
+    
+    def _apply_prefilter(self, items: List[Dict]) -> List[Dict]:
+        """Discard items the local pre-filter scores below threshold, returns the rest"""
+        if self.prefilter_threshold <= 0:
+            return items
         
-        for item in items:
+        try:
+            prefilter = self._get_prefilter()
+            if not prefilter.is_trained:
+                return items
+            scores = prefilter.score(items)
+        except Exception as e:
+            logger.error(f"Pre-filter failed, classifying all items: {e}", exc_info=True)
+            return items
+        
+        candidates = [item for item, score in zip(items, scores) if score >= self.prefilter_threshold]
+        rejected_ids = [item['id'] for item, score in zip(items, scores) if score < self.prefilter_threshold]
+        if rejected_ids:
+            self.db.update_raw_items(rejected_ids, {'status': 'DISCARDED', 'discard_reason': self.PREFILTER_REASON})
+        
+        saved_calls = len(rejected_ids) if self.batch_size == 1 else -(-len(rejected_ids) // self.batch_size)
+        logger.info(f"Pre-filter rejected {len(rejected_ids)}/{len(items)} items, saving ~{saved_calls} AI requests")
+        return candidates
+    
+    def _collapse_near_duplicates(self, items: List[Dict]) -> List[Dict]:
+        """Keep one representative per near-duplicate cluster, discarding the rest"""
+        if not items:
+            return items
+        
+        since = (datetime.now(timezone.utc) - timedelta(hours=self.DUPLICATE_LOOKBACK_HOURS)).isoformat()
+        try:
+            history = self.db.get_recent_processed_raw_items(since, self.DUPLICATE_HISTORY_ITEMS)
+            docs = [(row['id'], self._dedup_text(row)) for row in history]
+            # Earliest published first so it becomes the representative of a new cluster
+            ordered = sorted(items, key=lambda item: item.get('published_at') or '')
+            docs.extend((item['id'], self._dedup_text(item)) for item in ordered)
+            clusters = NearDuplicateDetector().find_clusters(docs)
+        except Exception as e:
+            logger.error(f"Near-duplicate detection failed, classifying all items: {e}", exc_info=True)
+            return items
+        
+        history_ids = {row['id'] for row in history}
+        duplicate_ids = set()
+        for cluster in clusters:
+            # A story already made from this cluster wins; otherwise keep the first new item
+            representative = next((i for i in cluster if i in history_ids), cluster[0])
+            duplicates = [i for i in cluster if i != representative and i not in history_ids]
+            if duplicates:
+                self.db.update_raw_items(duplicates, {
+                    'status': 'DISCARDED',
+                    'discard_reason': self.DUPLICATE_REASON,
+                    'duplicate_of': representative
+                })
+                duplicate_ids.update(duplicates)
+        
+        if duplicate_ids:
+            logger.info(f"Collapsed {len(duplicate_ids)}/{len(items)} near-duplicate items")
+        return [item for item in items if item['id'] not in duplicate_ids]
+    
+    def _dedup_text(self, item: Dict) -> str:
+        """Get the text compared for near-duplicate detection"""
+        return f"{item['title']} {(item.get('snippet') or '')[:500]}"
+    
+    def _get_prefilter(self) -> PreFilter:
+        """Get the shared pre-filter, retraining it on recent classification outcomes when stale"""
+        prefilter = Classifier._prefilter
+        if prefilter is None or prefilter.is_stale():
+            history = self.db.get_classified_raw_items(self.PREFILTER_TRAINING_ITEMS)
+            # Pre-filter and error discards aren't model verdicts, so they'd only teach the filter about itself
+            labelled = [
+                row for row in history
+                if row['status'] == 'PROCESSED' or row.get('discard_reason') == self.BELOW_THRESHOLD_REASON
+            ]
+            prefilter = PreFilter()
+            prefilter.train(labelled, [1 if row['status'] == 'PROCESSED' else 0 for row in labelled])
+            Classifier._prefilter = prefilter
+        return prefilter
+    
+    def _classify_item(self, item: Dict):
+        """Classify one item, returning its classification, None, or the exception raised"""
+        try:
+            return self._classify_and_score(item)
+        except Exception as e:
+            logger.error(f"Error processing item {item['id']}: {e}", exc_info=True)
+            return e
+    
+    def _classify_batch(self, batch: List[Dict]) -> List:
+        """Classify a batch in one request, falling back to single calls for dropped or invalid items"""
+        hashes = [self._content_hash(item) for item in batch]
+        verdicts = {}
+        pending = []
+        for i, (item, content_hash) in enumerate(zip(batch, hashes)):
+            cached = self._get_cached_classification(content_hash)
+            if cached is None:
+                pending.append(i)
+            else:
+                verdicts[i] = cached
+        
+        if len(pending) > 1:
+            try:
+                batch_verdicts = self._request_batch_classification([batch[i] for i in pending])
+            except Exception as e:
+                logger.warning(f"Batch classification failed, falling back to single requests: {e}")
+                batch_verdicts = {}
+            for position, i in enumerate(pending):
+                verdict = batch_verdicts.get(str(position))
+                if verdict is not None:
+                    verdicts[i] = verdict
+                    self._cache_classification(hashes[i], verdict)
+        
+        results = []
+        for i, item in enumerate(batch):
+            if i in verdicts:
+                results.append(self._evaluate(verdicts[i]))
+                continue
+            
+            # Not cached and missing from the batch response
             try:
-                result = self._classify_and_score(item)
-                if result:
-                    self._create_story(item, result)
-                    self.db.update_raw_item(item['id'], {'status': 'PROCESSED'})
-                else:
-                    self.db.update_raw_item(item['id'], {
-                        'status': 'DISCARDED',
-                        'discard_reason': 'Failed classification or below threshold'
-                    })
+                verdict = self._request_classification(item)
+                self._cache_classification(hashes[i], verdict)
+                results.append(self._evaluate(verdict))
             except Exception as e:
                 logger.error(f"Error processing item {item['id']}: {e}", exc_info=True)
-                self.db.update_raw_item(item['id'], {
-                    'status': 'DISCARDED',
-                    'discard_reason': f'Error: {str(e)}'
-                })
+                results.append(e)
+        
+        fallbacks = len(batch) - len(verdicts)
+        if fallbacks and len(pending) > 1:
+            logger.info(f"Batch classification fell back to single requests for {fallbacks}/{len(batch)} items")
+        return results
+    
+    def _save_results(self, items: List[Dict], results: List) -> int:
+        """Write stories and raw item statuses in bulk, returns how many stories were created"""
+        stories = []
+        processed_ids = []
+        discarded = {}  # discard_reason -> item ids
+        
+        for item, result in zip(items, results):
+            if isinstance(result, Exception):
+                discarded.setdefault(f'Error: {str(result)}', []).append(item['id'])
+            elif result:
+                stories.append(self._build_story(item, result))
+                processed_ids.append(item['id'])
+            else:
+                discarded.setdefault(self.BELOW_THRESHOLD_REASON, []).append(item['id'])
+        
+        if stories:
+            self.db.insert_stories(stories)
+            for story in stories:
+                logger.info(f"Created story: {story['category']} (score: {story['shock_score']})")
+        if processed_ids:
+            self.db.update_raw_items(processed_ids, {'status': 'PROCESSED'})
+        for reason, item_ids in discarded.items():
+            self.db.update_raw_items(item_ids, {'status': 'DISCARDED', 'discard_reason': reason})
+        
+        logger.info(f"Classified {len(items)} items: {len(processed_ids)} stories, {len(items) - len(processed_ids)} discarded")
+        return len(stories)
     
     def _classify_and_score(self, item: Dict) -> Optional[Dict]:
-        """Classify item and calculate shock score"""
+        """Classify item and calculate shock score, raising if the model can't be reached"""
+        content_hash = self._content_hash(item)
+        result = self._get_cached_classification(content_hash)
+        if result is None:
+            result = self._request_classification(item)
+            self._cache_classification(content_hash, result)
+        
+        return self._evaluate(result)
+    
+    def _evaluate(self, result: Dict) -> Optional[Dict]:
+        """Apply category and threshold rules to a model verdict"""
+        if result.get('category') == 'DISCARD':
+            return None
+        
+        if result.get('category') not in self.CATEGORIES:
+            logger.warning(f"Invalid category returned: {result.get('category')}")
+            return None
+        
+        shock_score = result.get('shock_score', 0)
+        if shock_score < self.threshold:
+            logger.debug(f"Item below threshold: {shock_score} < {self.threshold}")
+            return None
+        
+        return result
+    
+    def _content_hash(self, item: Dict) -> str:
+        """Hash the normalised title+snippet so syndicated copies share a cache key"""
+        text = f"{item['title']}\n{(item.get('snippet') or '')[:500]}".lower()
+        text = re.sub(r'[^\w\s]', '', text)
+        text = re.sub(r'\s+', ' ', text).strip()
+        return hashlib.sha256(text.encode()).hexdigest()
+    
+    def _get_cached_classification(self, content_hash: str) -> Optional[Dict]:
+        """Look up a cached classification for this prompt version and model"""
+        since = (datetime.now(timezone.utc) - timedelta(hours=self.CACHE_TTL_HOURS)).isoformat()
+        try:
+            result = self.db.get_cached_classification(content_hash, self.PROMPT_VERSION, self.MODEL, since)
+        except Exception as e:
+            logger.warning(f"Classification cache lookup failed: {e}")
+            result = None
+        
+        with self._stats_lock:
+            if result is None:
+                self.cache_misses += 1
+            else:
+                self.cache_hits += 1
+        if result is not None:
+            logger.debug(f"Classification cache hit: {content_hash[:12]}")
+        return result
+    
+    def _prune_cache(self):
+        """Delete cached classifications past CACHE_TTL_HOURS, which lookups already ignore"""
+        before = (datetime.now(timezone.utc) - timedelta(hours=self.CACHE_TTL_HOURS)).isoformat()
+        try:
+            self.db.delete_expired_classifications(before)
+        except Exception as e:
+            logger.warning(f"Classification cache cleanup failed: {e}")
+    
+    def _cache_classification(self, content_hash: str, result: Dict):
+        """Store a classification so repeated content skips the API call"""
+        try:
+            self.db.upsert_cached_classification({
+                'content_hash': content_hash,
+                'prompt_version': self.PROMPT_VERSION,
+                'model': self.MODEL,
+                'result_json': result,
+                'created_at': datetime.now(timezone.utc).isoformat()
+            })
+        except Exception as e:
+            logger.warning(f"Classification cache write failed: {e}")
+    
+    def _request_classification(self, item: Dict) -> Dict:
+        """Ask the model to classify and score an item"""
         prompt = f"""Analyze this news story and classify it into exactly ONE category, then score its "shock value" (0-100).
 
 Story:
 Title: {item['title']}
-Snippet: {item.get('snippet', '')[:500]}
+Snippet: {(item.get('snippet') or '')[:500]}
 
-Categories (choose exactly ONE):
-1. AI & Automation Takeovers
-2. Corporate Collapses & Reversals
-3. Tech Decisions With Massive Fallout
-4. Laws & Rules That Quietly Changed Everything
-5. Money & Market Shock
-
-Shock Score Components (total 0-100):
-- Scale (0-30): How many people/companies affected?
-- Speed (0-20): How quickly did this happen?
-- Power shift (0-25): How much did power/control change?
-- Permanence (0-15): How permanent is this change?
-- Explainability (0-10): How hard is this to explain to average person?
-
-Rules:
-- If story is unclear, political rage, graphic violence, or speculation-heavy, return "DISCARD"
-- If shock score is below 65, return "DISCARD"
-- Only return valid category if story clearly fits
+{self.RUBRIC}
 
 Return JSON format:
 {{
@@ -101,41 +388,99 @@ Return JSON format:
     "reasoning": "brief explanation"
 }}"""
         
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4",
+        return self._complete(prompt, self.MAX_COMPLETION_TOKENS)
+    
+    def _request_batch_classification(self, batch: List[Dict]) -> Dict[str, Dict]:
+        """Ask the model to classify several items at once, returns valid verdicts keyed by batch position"""
+        stories = '\n\n'.join(
+            f"[{i}]\nTitle: {item['title']}\nSnippet: {(item.get('snippet') or '')[:500]}"
+            for i, item in enumerate(batch)
+        )
+        prompt = f"""Analyze each of these {len(batch)} news stories independently. For each, classify it into exactly ONE category, then score its "shock value" (0-100).
+
+Stories:
+{stories}
+
+{self.RUBRIC}
+
+Return JSON format, with exactly one result per story, using the story's number as "id":
+{{
+    "results": [
+        {{
+            "id": "0",
+            "category": "category name or DISCARD",
+            "shock_score": 0-100,
+            "factors": {{
+                "scale": 0-30,
+                "speed": 0-20,
+                "power_shift": 0-25,
+                "permanence": 0-15,
+                "explainability": 0-10
+            }},
+            "reasoning": "brief explanation"
+        }}
+    ]
+}}"""
+        
+        response = self._complete(prompt, self.MAX_COMPLETION_TOKENS * len(batch))
+        results = response.get('results') if isinstance(response, dict) else None
+        if not isinstance(results, list):
+            return {}
+        
+        verdicts = {}
+        for result in results:
+            if not isinstance(result, dict):
+                continue
+            item_id = str(result.pop('id', ''))
+            if item_id.isdigit() and int(item_id) < len(batch) and item_id not in verdicts and self._is_valid_verdict(result):
+                verdicts[item_id] = result
+        return verdicts
+    
+    def _is_valid_verdict(self, result: Dict) -> bool:
+        """Check a batched verdict has the same shape a single-item call would return"""
+        category = result.get('category')
+        shock_score = result.get('shock_score')
+        if category != 'DISCARD' and category not in self.CATEGORIES:
+            return False
+        if isinstance(shock_score, bool) or not isinstance(shock_score, (int, float)) or not 0 <= shock_score <= 100:
+            return False
+        return isinstance(result.get('factors', {}), dict)
+    
+    def _complete(self, prompt: str, max_tokens: int) -> Dict:
+        """Send a rate-limited, retried JSON completion request"""
+        # Rough token estimate (~4 chars/token) plus the completion budget
+        estimated_tokens = len(prompt) // 4 + max_tokens
+        
+        def create():
+            self.rate_limiter.acquire(estimated_tokens)
+            return self.client.chat.completions.create(
+                model=self.MODEL,
                 messages=[
                     {"role": "system", "content": "You are a news classifier for Orbix Network. Return only valid JSON."},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.3,
+                max_tokens=max_tokens,
                 response_format={"type": "json_object"}
             )
-            
-            result = json.loads(response.choices[0].message.content)
-            
-            # Validate result
-            if result.get('category') == 'DISCARD':
-                return None
-            
-            if result.get('category') not in self.CATEGORIES:
-                logger.warning(f"Invalid category returned: {result.get('category')}")
-                return None
-            
-            shock_score = result.get('shock_score', 0)
-            if shock_score < self.threshold:
-                logger.debug(f"Item below threshold: {shock_score} < {self.threshold}")
-                return None
-            
-            return result
-            
-        except Exception as e:
-            logger.error(f"Error in AI classification: {e}", exc_info=True)
-            return None
+        
+        response = retry_with_jitter(
+            create,
+            retry_on=(APIStatusError, APIConnectionError),
+            should_retry=self._is_retryable
+        )
+        
+        return json.loads(response.choices[0].message.content)
     
-    def _create_story(self, item: Dict, classification: Dict):
-        """Create a story record from classified item"""
-        story = {
+    def _is_retryable(self, error: Exception) -> bool:
+        """Retry rate limits, server errors and connection failures"""
+        if isinstance(error, APIStatusError):
+            return error.status_code == 429 or error.status_code >= 500
+        return True
+    
+    def _build_story(self, item: Dict, classification: Dict) -> Dict:
+        """Build a story record from classified item"""
+        return {
             'raw_item_id': item['id'],
             'category': classification['category'],
             'shock_score': classification['shock_score'],
@@ -143,8 +488,5 @@ Return JSON format:
             'status': 'QUEUED',
             'decision_reason': classification.get('reasoning', '')
         }
-        
-        story_id = self.db.insert_story(story)
-        if story_id:
-            logger.info(f"Created story: {classification['category']} (score: {classification['shock_score']})")
+
 
@@ -2,9 +2,17 @@
 Database module for Supabase interactions
 """
 import os
+import base64
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone, timedelta
+import requests
 from supabase import create_client, Client
 from typing import Optional, Dict, List, Any
 import logging
+from modules.rate_limiter import retry_with_jitter
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +20,20 @@ logger = logging.getLogger(__name__)
 class Database:
     """Wrapper for Supabase database operations"""
     
+    # Settings are cached process-wide so every job and module shares one copy
+    SETTINGS_TTL_SECONDS = 15
+    _settings: Optional[Dict[str, Any]] = None
+    _settings_loaded_at = 0.0
+    _settings_lock = threading.Lock()
+    
+    # Work claimed through claim_work is leased to this process and skipped by other workers until it expires
+    LEASE_SECONDS = 600
+    WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+    
+    # Supabase's resumable upload endpoint requires every chunk but the last to be exactly 6MB
+    STORAGE_CHUNK_BYTES = 6 * 1024 * 1024
+    STORAGE_CHUNK_TIMEOUT_SECONDS = 120
+    
     def __init__(self):
         supabase_url = os.getenv('SUPABASE_URL')
         supabase_key = os.getenv('SUPABASE_KEY')
@@ -20,19 +42,124 @@ class Database:
             raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set")
         
         self.client: Client = create_client(supabase_url, supabase_key)
+        self.supabase_url = supabase_url.rstrip('/')
+        self.supabase_key = supabase_key
+        self.http = requests.Session()
     
     def get_setting(self, key: str) -> Any:
         """Get a setting value"""
-        result = self.client.table('settings').select('value').eq('key', key).execute()
-        if result.data:
-            return result.data[0]['value']
-        return None
+        return self.get_settings().get(key)
+    
+    def get_settings(self) -> Dict[str, Any]:
+        """Get all settings, reloading them in one query once the cache is older than SETTINGS_TTL_SECONDS"""
+        with Database._settings_lock:
+            age = time.monotonic() - Database._settings_loaded_at
+            if Database._settings is None or age > self.SETTINGS_TTL_SECONDS:
+                try:
+                    result = self.client.table('settings').select('key, value').execute()
+                    Database._settings = {row['key']: row['value'] for row in result.data}
+                    Database._settings_loaded_at = time.monotonic()
+                except Exception as e:
+                    if Database._settings is None:
+                        raise
+                    logger.warning(f"Error reloading settings, using cached values: {e}")
+            return Database._settings
+    
+    def claim_work(self, table: str, from_status: str, limit: int, to_status: Optional[str] = None,
+                   status_column: str = 'status', order_column: str = 'created_at', candidates: Optional[str] = None,
+                   lease_seconds: Optional[int] = None) -> List[Dict]:
+        """Atomically lease up to `limit` of the oldest rows in `from_status`, moving them to `to_status` if given.
+        
+        Rows already in `to_status` whose lease expired are reclaimed, so work left by a crashed worker is picked up
+        again. `candidates` optionally names a view restricting which ids are eligible.
+        """
+        if limit <= 0:
+            return []
+        result = self.client.rpc('claim_work', {
+            'target': table,
+            'status_column': status_column,
+            'from_status': from_status,
+            'to_status': to_status,
+            'worker': self.WORKER_ID,
+            'batch_size': limit,
+            'lease_seconds': lease_seconds or self.LEASE_SECONDS,
+            'order_column': order_column,
+            'candidates': candidates
+        }).execute()
+        return result.data or []
+    
+    def heartbeat_work(self, table: str, ids: List[str], lease_seconds: Optional[int] = None) -> int:
+        """Extend the lease on rows this worker still holds, returns how many were extended"""
+        if not ids:
+            return 0
+        result = self.client.rpc('heartbeat_work', {
+            'target': table,
+            'ids': ids,
+            'worker': self.WORKER_ID,
+            'lease_seconds': lease_seconds or self.LEASE_SECONDS
+        }).execute()
+        return result.data or 0
+    
+    def release_work(self, table: str, ids: List[str]):
+        """Give up the lease on rows this worker holds so any worker can claim them again"""
+        if ids:
+            self.client.rpc('release_work', {'target': table, 'ids': ids, 'worker': self.WORKER_ID}).execute()
+    
+    def lease_fields(self, lease_seconds: Optional[int] = None) -> Dict:
+        """Columns that mark a newly inserted row as already claimed by this worker"""
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=lease_seconds or self.LEASE_SECONDS)
+        return {'claimed_by': self.WORKER_ID, 'lease_expires_at': expires_at.isoformat()}
+    
+    def release_fields(self) -> Dict:
+        """Columns that clear a row's lease, to write alongside the outcome of the claimed work"""
+        return {'claimed_by': None, 'lease_expires_at': None}
+    
+    @contextmanager
+    def leased(self, table: str, ids: List[str], lease_seconds: Optional[int] = None):
+        """Keep the lease on `ids` alive with a background heartbeat for the duration of the block"""
+        lease_seconds = lease_seconds or self.LEASE_SECONDS
+        stop = threading.Event()
+        
+        def heartbeat():
+            while not stop.wait(lease_seconds / 3):
+                try:
+                    self.heartbeat_work(table, ids, lease_seconds)
+                except Exception as e:
+                    logger.warning(f"Lease heartbeat failed for {len(ids)} {table} rows: {e}")
+        
+        thread = threading.Thread(target=heartbeat, name=f"lease-{table}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+    
+    def _with_relations(self, table: str, select: str, rows: List[Dict]) -> List[Dict]:
+        """Re-read claimed rows with embedded relations, keeping claim order"""
+        if not rows:
+            return []
+        result = self.client.table(table).select(select).in_('id', [row['id'] for row in rows]).execute()
+        by_id = {row['id']: row for row in result.data}
+        return [by_id[row['id']] for row in rows if row['id'] in by_id]
     
     def get_enabled_sources(self) -> List[Dict]:
         """Get all enabled sources"""
         result = self.client.table('sources').select('*').eq('enabled', True).execute()
         return result.data
     
+    def get_due_sources(self, now: str) -> List[Dict]:
+        """Get enabled sources that have no next fetch time or are due by `now`"""
+        result = self.client.table('sources').select('*') \
+            .eq('enabled', True) \
+            .or_(f'next_fetch_at.is.null,next_fetch_at.lte.{now}') \
+            .execute()
+        return result.data
+    
+    def update_source(self, source_id: str, updates: Dict):
+        """Update a source"""
+        self.client.table('sources').update(updates).eq('id', source_id).execute()
+    
     def insert_raw_item(self, item: Dict) -> Optional[str]:
         """Insert a raw item, returns id if successful"""
         try:
@@ -46,15 +173,88 @@ class Database:
                 logger.error(f"Error inserting raw item: {e}")
         return None
     
-    def get_new_raw_items(self) -> List[Dict]:
-        """Get raw items with status NEW"""
-        result = self.client.table('raw_items').select('*').eq('status', 'NEW').execute()
-        return result.data
+    def insert_raw_items(self, items: List[Dict]) -> List[Dict]:
+        """Bulk insert raw items, skipping existing urls. Returns only the newly inserted rows"""
+        if not items:
+            return []
+        # ON CONFLICT (url) DO NOTHING; the response contains only rows that were actually inserted
+        result = self.client.table('raw_items').upsert(
+            items, on_conflict='url', ignore_duplicates=True
+        ).execute()
+        return result.data or []
+    
+    def _select_pages(self, build_query, limit: int, page_size: int = 1000) -> List[Dict]:
+        """Run a select in pages of `page_size` rows (PostgREST caps rows per request) up to `limit` rows"""
+        rows = []
+        offset = 0
+        while offset < limit:
+            end = min(offset + page_size, limit) - 1
+            result = build_query().range(offset, end).execute()
+            rows.extend(result.data)
+            if len(result.data) < end - offset + 1:
+                break
+            offset = end + 1
+        return rows
+    
+    def get_recent_raw_item_keys(self, limit: int) -> List[Dict]:
+        """Get url and hash of the most recent raw items, newest first"""
+        return self._select_pages(
+            lambda: self.client.table('raw_items').select('url, hash').order('created_at', desc=True),
+            limit
+        )
+    
+    def get_classified_raw_items(self, limit: int) -> List[Dict]:
+        """Get the most recent raw items with a classification outcome (PROCESSED or DISCARDED)"""
+        return self._select_pages(
+            lambda: self.client.table('raw_items').select('title, snippet, status, discard_reason') \
+                .in_('status', ['PROCESSED', 'DISCARDED']) \
+                .order('created_at', desc=True),
+            limit
+        )
+    
+    def get_recent_processed_raw_items(self, since: str, limit: int) -> List[Dict]:
+        """Get raw items that became stories since `since`, newest first"""
+        return self._select_pages(
+            lambda: self.client.table('raw_items').select('id, title, snippet') \
+                .eq('status', 'PROCESSED') \
+                .gte('created_at', since) \
+                .order('created_at', desc=True),
+            limit
+        )
+    
+    def claim_new_raw_items(self, limit: int) -> List[Dict]:
+        """Lease up to `limit` NEW raw items for classification"""
+        return self.claim_work('raw_items', 'NEW', limit)
     
     def update_raw_item(self, item_id: str, updates: Dict):
         """Update a raw item"""
         self.client.table('raw_items').update(updates).eq('id', item_id).execute()
     
+    def get_cached_classification(self, content_hash: str, prompt_version: str, model: str, since: str) -> Optional[Dict]:
+        """Get a cached classification result created after `since`"""
+        result = self.client.table('classification_cache').select('result_json') \
+            .eq('content_hash', content_hash) \
+            .eq('prompt_version', prompt_version) \
+            .eq('model', model) \
+            .gte('created_at', since) \
+            .execute()
+        if result.data:
+            return result.data[0]['result_json']
+        return None
+    
+    def upsert_cached_classification(self, entry: Dict):
+        """Store a classification result in the cache"""
+        self.client.table('classification_cache').upsert(entry, on_conflict='content_hash,prompt_version,model').execute()
+    
+    def delete_expired_classifications(self, before: str):
+        """Delete cached classifications created before `before`"""
+        self.client.table('classification_cache').delete().lt('created_at', before).execute()
+    
+    def update_raw_items(self, item_ids: List[str], updates: Dict):
+        """Apply the same update to several raw items"""
+        if item_ids:
+            self.client.table('raw_items').update(updates).in_('id', item_ids).execute()
+    
     def insert_story(self, story: Dict) -> Optional[str]:
         """Insert a story, returns id if successful"""
         result = self.client.table('stories').insert(story).execute()
@@ -62,10 +262,16 @@ class Database:
             return result.data[0]['id']
         return None
     
-    def get_queued_stories(self) -> List[Dict]:
-        """Get stories with status QUEUED"""
-        result = self.client.table('stories').select('*').eq('status', 'QUEUED').execute()
-        return result.data
+    def insert_stories(self, stories: List[Dict]) -> List[str]:
+        """Insert several stories in one request, returns their ids"""
+        if not stories:
+            return []
+        result = self.client.table('stories').insert(stories).execute()
+        return [row['id'] for row in result.data]
+    
+    def claim_queued_stories(self, limit: int) -> List[Dict]:
+        """Lease up to `limit` QUEUED stories for script generation"""
+        return self.claim_work('stories', 'QUEUED', limit)
     
     def update_story(self, story_id: str, updates: Dict):
         """Update a story"""
@@ -87,32 +293,14 @@ class Database:
         """Update a review queue item"""
         self.client.table('review_queue').update(updates).eq('id', review_id).execute()
     
-    def get_approved_scripts_for_rendering(self) -> List[Dict]:
-        """Get scripts that are approved and ready for rendering"""
-        # Get all scripts with their stories
-        result = self.client.table('scripts').select('*, stories(*)').execute()
-        approved_scripts = []
-        
-        for script in result.data:
-            story = script.get('stories', {})
-            if not story or story.get('status') != 'APPROVED':
-                continue
-            
-            # Check if review is approved or doesn't exist
-            review_check = self.client.table('review_queue').select('*').eq('script_id', script['id']).execute()
-            if review_check.data and review_check.data[0].get('status') != 'APPROVED':
-                continue
-            
-            # Check if render already exists
-            render_check = self.client.table('renders').select('id').eq('script_id', script['id']).execute()
-            if render_check.data:
-                continue
-            
-            # Add story_id to script dict for convenience
-            script['story_id'] = story['id']
-            approved_scripts.append(script)
-        
-        return approved_scripts
+    def get_approved_scripts_for_rendering(self, limit: int = 50, offset: int = 0) -> List[Dict]:
+        """Get a page of scripts that are approved and ready for rendering"""
+        # scripts_ready_for_render filters on story/review/render state server-side
+        result = self.client.table('scripts_ready_for_render').select('*') \
+            .order('created_at') \
+            .range(offset, offset + limit - 1) \
+            .execute()
+        return result.data
     
     def insert_render(self, render: Dict) -> Optional[str]:
         """Insert a render record"""
@@ -121,25 +309,20 @@ class Database:
             return result.data[0]['id']
         return None
     
-    def get_pending_renders(self) -> List[Dict]:
-        """Get renders with status PENDING"""
-        result = self.client.table('renders').select('*, scripts(*), stories(*)').eq('render_status', 'PENDING').execute()
-        return result.data
+    def claim_pending_renders(self, limit: int) -> List[Dict]:
+        """Lease up to `limit` PENDING renders (or PROCESSING ones whose lease expired) as PROCESSING, with script and story"""
+        claimed = self.claim_work('renders', 'PENDING', limit, to_status='PROCESSING', status_column='render_status')
+        return self._with_relations('renders', '*, scripts(*), stories(*)', claimed)
     
     def update_render(self, render_id: str, updates: Dict):
         """Update a render"""
         self.client.table('renders').update(updates).eq('id', render_id).execute()
     
-    def get_completed_renders(self) -> List[Dict]:
-        """Get renders that are completed but not published"""
-        result = self.client.table('renders').select('*, scripts(*), stories(*)').eq('render_status', 'COMPLETED').execute()
-        # Filter out already published
-        unpublished = []
-        for render in result.data:
-            publish_check = self.client.table('publishes').select('*').eq('render_id', render['id']).execute()
-            if not publish_check.data:
-                unpublished.append(render)
-        return unpublished
+    def claim_completed_renders(self, limit: int) -> List[Dict]:
+        """Lease up to `limit` unpublished completed renders, with script and story, for publishing"""
+        claimed = self.claim_work('renders', 'COMPLETED', limit, status_column='render_status',
+                                  order_column='completed_at', candidates='renders_ready_for_publish')
+        return self._with_relations('renders', '*, scripts(*), stories(*, raw_items(fetched_at))', claimed)
     
     def insert_publish(self, publish: Dict) -> Optional[str]:
         """Insert a publish record"""
@@ -148,6 +331,53 @@ class Database:
             return result.data[0]['id']
         return None
     
+    def insert_publishes(self, publishes: List[Dict]) -> List[Dict]:
+        """Insert several publish records in one request, returns the inserted rows"""
+        if not publishes:
+            return []
+        result = self.client.table('publishes').insert(publishes).execute()
+        return result.data
+    
+    def claim_interrupted_publishes(self, limit: int) -> List[Dict]:
+        """Lease up to `limit` UPLOADING publishes whose worker gave up or died, with their render, script and story"""
+        claimed = self.claim_work('publishes', 'UPLOADING', limit, status_column='publish_status')
+        return self._with_relations('publishes', '*, renders(*, scripts(*), stories(*, raw_items(fetched_at)))', claimed)
+    
+    def update_publish(self, publish_id: str, updates: Dict):
+        """Update a publish record"""
+        self.client.table('publishes').update(updates).eq('id', publish_id).execute()
+    
+    def get_publish_slots_used(self, day: str, day_start: str, day_end: str) -> int:
+        """Get how many of a channel-local day's publish slots are taken"""
+        result = self.client.rpc('publish_slots_used', {
+            'target_day': day, 'day_start': day_start, 'day_end': day_end
+        }).execute()
+        return result.data or 0
+    
+    def claim_publish_slots(self, day: str, day_start: str, day_end: str, cap: int, wanted: int) -> int:
+        """Atomically take up to `wanted` of a day's remaining publish slots under `cap`, returns how many were granted"""
+        if wanted <= 0:
+            return 0
+        result = self.client.rpc('claim_publish_slots', {
+            'target_day': day, 'day_start': day_start, 'day_end': day_end, 'cap': cap, 'wanted': wanted
+        }).execute()
+        return result.data or 0
+    
+    def release_publish_slots(self, day: str, count: int):
+        """Give back publish slots that were claimed but not used"""
+        if count > 0:
+            self.client.rpc('release_publish_slots', {'target_day': day, 'released': count}).execute()
+    
+    def fail_publish(self, publish_id: str, attempts: int, day: str) -> bool:
+        """Mark a publish FAILED, giving `day`'s slot back if no other platform still has the video.
+        
+        Returns whether the slot was released.
+        """
+        result = self.client.rpc('fail_publish', {
+            'target_id': publish_id, 'attempts': attempts, 'target_day': day
+        }).execute()
+        return bool(result.data)
+    
     def get_published_videos(self) -> List[Dict]:
         """Get all published videos for analytics"""
         result = self.client.table('publishes').select('*').eq('publish_status', 'PUBLISHED').execute()
@@ -161,6 +391,68 @@ class Database:
         """Upload file to Supabase Storage"""
         self.client.storage.from_(bucket).upload(path, file_data, file_options={"content-type": content_type})
     
+    def upload_file_from_path(self, bucket: str, path: str, file_path: str, content_type: str = 'video/mp4'):
+        """Stream a file to Supabase Storage through the resumable (TUS) endpoint.
+        
+        Only one chunk is held in memory at a time and each chunk is retried on its own,
+        resuming from the offset the server reports.
+        """
+        size = os.path.getsize(file_path)
+        headers = {
+            'Authorization': f"Bearer {self.supabase_key}",
+            'apikey': self.supabase_key,
+            'Tus-Resumable': '1.0.0'
+        }
+        metadata = {'bucketName': bucket, 'objectName': path, 'contentType': content_type, 'cacheControl': '3600'}
+        create_headers = {
+            **headers,
+            'Upload-Length': str(size),
+            'Upload-Metadata': ','.join(f"{k} {base64.b64encode(v.encode()).decode()}" for k, v in metadata.items()),
+            # A render reclaimed after a crash may have uploaded a partial object already
+            'x-upsert': 'true'
+        }
+        
+        def create():
+            response = self.http.post(f"{self.supabase_url}/storage/v1/upload/resumable", headers=create_headers,
+                                      timeout=self.STORAGE_CHUNK_TIMEOUT_SECONDS)
+            response.raise_for_status()
+            return response.headers['Location']
+        
+        upload_url = retry_with_jitter(create, (requests.RequestException,), should_retry=self._is_retryable_upload_error)
+        
+        offset = 0
+        logged_percent = 0
+        with open(file_path, 'rb') as f:
+            while offset < size:
+                offset = retry_with_jitter(lambda offset=offset: self._upload_chunk(upload_url, headers, f, offset),
+                                           (requests.RequestException,), should_retry=self._is_retryable_upload_error)
+                percent = offset * 100 // size
+                if percent >= logged_percent + 25 or offset == size:
+                    logged_percent = percent
+                    logger.info(f"Upload progress for {path}: {percent}% of {size / 1024 / 1024:.1f}MB")
+    
+    def _upload_chunk(self, upload_url: str, headers: Dict, f, offset: int) -> int:
+        """Send the chunk starting at `offset`, returns the server's new offset"""
+        f.seek(offset)
+        chunk = f.read(self.STORAGE_CHUNK_BYTES)
+        response = self.http.patch(upload_url, data=chunk, headers={
+            **headers,
+            'Upload-Offset': str(offset),
+            'Content-Type': 'application/offset+octet-stream'
+        }, timeout=self.STORAGE_CHUNK_TIMEOUT_SECONDS)
+        
+        if response.status_code == 409:
+            # Offset mismatch: an earlier attempt landed (at least partly) but its response was lost
+            head = self.http.head(upload_url, headers=headers, timeout=self.STORAGE_CHUNK_TIMEOUT_SECONDS)
+            head.raise_for_status()
+            return int(head.headers['Upload-Offset'])
+        response.raise_for_status()
+        return int(response.headers['Upload-Offset'])
+    
+    def _is_retryable_upload_error(self, e: requests.RequestException) -> bool:
+        """Retry network errors, rate limits and server errors; client errors won't succeed on retry"""
+        return e.response is None or e.response.status_code == 429 or e.response.status_code >= 500
+    
     def get_public_url(self, bucket: str, path: str) -> str:
         """Get public URL for a file in storage"""
         return self.client.storage.from_(bucket).get_public_url(path)
@@ -0,0 +1,97 @@
+"""
+In-process dedup index for scraped items
+"""
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DedupIndex:
+    """Bounded LRU set of recently seen url/content hashes.
+    
+    Keys are truncated sha256 digests so each entry costs a few bytes of key data;
+    at 8 bytes the chance of any collision across 1M entries is below 1e-7.
+    """
+    
+    DIGEST_BYTES = 8
+    
+    def __init__(self, capacity: int = 100000):
+        self.capacity = capacity
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def keys_for(self, item: Dict) -> List[bytes]:
+        """Get the index keys for a raw item: its url and its content hash"""
+        keys = [self._digest(f"url:{item['url']}")]
+        if item.get('hash'):
+            keys.append(self._digest(f"hash:{item['hash']}"))
+        return keys
+    
+    def seen(self, item: Dict) -> bool:
+        """Check whether a raw item was seen recently, refreshing its recency"""
+        with self._lock:
+            for key in self.keys_for(item):
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True
+            self.misses += 1
+            return False
+    
+    def add(self, items: Iterable[Dict]):
+        """Record raw items as seen, evicting the least recently seen entries"""
+        with self._lock:
+            for item in items:
+                for key in self.keys_for(item):
+                    self._entries[key] = None
+                    self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+    
+    def load(self, path: str) -> bool:
+        """Load entries persisted by save(), returns False if there is nothing to load"""
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            logger.warning(f"Could not read dedup index {path}: {e}")
+            return False
+        
+        size = self.DIGEST_BYTES
+        with self._lock:
+            for offset in range(0, len(data) - size + 1, size):
+                self._entries[data[offset:offset + size]] = None
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+        logger.info(f"Loaded {len(self._entries)} dedup entries from {path}")
+        return True
+    
+    def save(self, path: Optional[str]):
+        """Persist entries, oldest first, as fixed-size digests"""
+        if not path:
+            return
+        with self._lock:
+            data = b''.join(self._entries.keys())
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write dedup index {path}: {e}")
+    
+    def _digest(self, value: str) -> bytes:
+        """Hash a key down to DIGEST_BYTES"""
+        return hashlib.sha256(value.encode()).digest()[:self.DIGEST_BYTES]
@@ -0,0 +1,83 @@
+"""
+Near-duplicate detection for stories covered by several sources
+"""
+import re
+import zlib
+import logging
+from typing import Dict, List, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class NearDuplicateDetector:
+    """MinHash signatures over normalised title+snippet words, bucketed with banded LSH.
+    
+    With 16 bands of 4 rows, pairs around 0.5 Jaccard similarity become candidates about
+    half the time and pairs above 0.7 almost always; candidates are then confirmed against
+    the estimated similarity before being clustered.
+    """
+    
+    NUM_PERM = 64
+    BANDS = 16
+    SIMILARITY_THRESHOLD = 0.5
+    PRIME = (1 << 31) - 1
+    
+    STOPWORDS = {
+        'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'have', 'in', 'is', 'it', 'its',
+        'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'were', 'will', 'with', 'after', 'over', 'new', 'says'
+    }
+    
+    def __init__(self, seed: int = 42):
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, self.PRIME, size=self.NUM_PERM, dtype=np.uint64)
+        self._b = rng.integers(0, self.PRIME, size=self.NUM_PERM, dtype=np.uint64)
+        self._rows = self.NUM_PERM // self.BANDS
+    
+    def shingles(self, text: str) -> set:
+        """Get the distinct non-stopword words of a text"""
+        words = re.findall(r"[a-z0-9][a-z0-9'\-]*", text.lower())
+        return {w for w in words if w not in self.STOPWORDS}
+    
+    def signature(self, text: str) -> np.ndarray:
+        """Get the MinHash signature of a text, or an empty array if it has no shingles"""
+        shingles = self.shingles(text)
+        if not shingles:
+            return np.zeros(0, dtype=np.uint64)
+        x = np.fromiter((zlib.crc32(s.encode()) % self.PRIME for s in shingles), dtype=np.uint64, count=len(shingles))
+        # (a*x + b) mod p for every shingle/permutation pair; a, x < 2^31 so this cannot overflow uint64
+        return ((np.outer(x, self._a) + self._b) % self.PRIME).min(axis=0)
+    
+    def find_clusters(self, docs: List[Tuple[str, str]]) -> List[List[str]]:
+        """Group (id, text) docs into near-duplicate clusters, each listed in input order"""
+        ids = [doc_id for doc_id, _ in docs]
+        signatures = [self.signature(text) for _, text in docs]
+        parent = list(range(len(docs)))
+        
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+        
+        for band in range(self.BANDS):
+            buckets: Dict[bytes, List[int]] = {}
+            start, end = band * self._rows, (band + 1) * self._rows
+            for i, sig in enumerate(signatures):
+                if not len(sig):
+                    continue
+                bucket = buckets.setdefault(sig[start:end].tobytes(), [])
+                for j in bucket:
+                    if find(i) != find(j) and self.similarity(sig, signatures[j]) >= self.SIMILARITY_THRESHOLD:
+                        parent[find(i)] = find(j)
+                bucket.append(i)
+        
+        clusters: Dict[int, List[str]] = {}
+        for i, doc_id in enumerate(ids):
+            clusters.setdefault(find(i), []).append(doc_id)
+        return list(clusters.values())
+    
+    def similarity(self, sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+        """Estimate Jaccard similarity from two signatures"""
+        return float(np.mean(sig_a == sig_b))
+
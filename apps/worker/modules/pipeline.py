@@ -0,0 +1,61 @@
+"""
+Event-driven chaining of pipeline stages
+"""
+import logging
+import threading
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Pipeline:
+    """Runs stages so that a stage producing work immediately triggers the next one.
+    
+    Interval jobs still call run() as a fallback sweep. A stage never runs twice at once:
+    a trigger that arrives while it is running makes it go round once more when it finishes.
+    """
+    
+    def __init__(self, scheduler, event_driven: bool = True):
+        self.scheduler = scheduler
+        self.event_driven = event_driven
+        self._stages: Dict[str, Callable[[], int]] = {}
+        self._next_stage: Dict[str, Optional[str]] = {}
+        self._running = set()
+        self._pending = set()
+        self._lock = threading.Lock()
+    
+    def add_stage(self, stage_id: str, func: Callable[[], int], next_stage: Optional[str] = None):
+        """Register a stage; `func` returns how many items it handed on to `next_stage`"""
+        self._stages[stage_id] = func
+        self._next_stage[stage_id] = next_stage
+    
+    def run(self, stage_id: str):
+        """Run a stage until no trigger arrived while it was running"""
+        with self._lock:
+            if stage_id in self._running:
+                self._pending.add(stage_id)
+                return
+            self._running.add(stage_id)
+        
+        try:
+            while True:
+                with self._lock:
+                    self._pending.discard(stage_id)
+                
+                produced = self._stages[stage_id]()
+                next_stage = self._next_stage[stage_id]
+                if produced and next_stage and self.event_driven:
+                    logger.debug(f"{stage_id} produced {produced} items, triggering {next_stage}")
+                    self.trigger(next_stage)
+                
+                with self._lock:
+                    if stage_id not in self._pending:
+                        break
+        finally:
+            with self._lock:
+                self._running.discard(stage_id)
+    
+    def trigger(self, stage_id: str):
+        """Schedule a stage to run now, outside its interval"""
+        self.scheduler.add_job(self.run, args=[stage_id], name=f"{stage_id} (triggered)")
+
@@ -0,0 +1,148 @@
+"""
+Platform adapters used by the publisher
+"""
+import os
+import logging
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Callable, Dict, List
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaFileUpload, build_http
+
+logger = logging.getLogger(__name__)
+
+
+class PlatformAdapter(ABC):
+    """Uploads a rendered video to one platform.
+    
+    The publisher runs uploads for different platforms concurrently and enforces each
+    adapter's limits; a new platform only needs a subclass and a `publishes.platform` value.
+    """
+    
+    platform = ''
+    uploads_per_minute = 10  # Rate limit across all of this worker's uploads to the platform
+    max_concurrent_uploads = 2
+    
+    def is_available(self) -> bool:
+        """Check whether the platform is configured well enough to upload"""
+        return True
+    
+    @abstractmethod
+    def upload(self, render: Dict, publish: Dict, video_path: Path, save_progress: Callable[[Dict], None]) -> str:
+        """Upload a video, returns the platform's video id.
+        
+        `publish` is the platform's publishes row, including any upload state saved by an earlier
+        attempt; `save_progress(updates)` persists new upload state on it. Raises on failure.
+        """
+
+
+class YouTubeAdapter(PlatformAdapter):
+    """YouTube Shorts via chunked resumable uploads"""
+    
+    platform = 'YOUTUBE'
+    uploads_per_minute = 6
+    max_concurrent_uploads = 2
+    CHUNK_RETRIES = 3  # Per chunk, for 5xx and rate-limit responses
+    
+    def __init__(self, youtube_service, privacy_status: str = 'public', chunk_size: int = None):
+        self.youtube_service = youtube_service
+        self.privacy_status = privacy_status
+        # Chunk size must be a multiple of 256KB
+        self.chunk_size = chunk_size or max(1, int(os.getenv('YOUTUBE_UPLOAD_CHUNK_MB', '8'))) * 1024 * 1024
+        self._local = threading.local()
+    
+    def is_available(self) -> bool:
+        return self.youtube_service is not None
+    
+    def _http(self) -> AuthorizedHttp:
+        """Get this thread's authorized Http.
+        
+        httplib2 isn't thread-safe, so concurrent uploads can't share the service's own Http;
+        each upload thread gets one built on the service's credentials instead.
+        """
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            http = self._local.http = AuthorizedHttp(self.youtube_service._http.credentials, http=build_http())
+        return http
+    
+    def upload(self, render: Dict, publish: Dict, video_path: Path, save_progress: Callable[[Dict], None]) -> str:
+        """Upload in chunks, saving the session after each one so a later run can resume it"""
+        body = {
+            'snippet': {
+                'title': publish['title'],
+                'description': publish['description'],
+                'tags': ['Orbix Network', render['stories']['category']],
+                'categoryId': '24'  # Entertainment
+            },
+            'status': {
+                'privacyStatus': self.privacy_status,
+                'selfDeclaredMadeForKids': False
+            }
+        }
+        
+        media = MediaFileUpload(str(video_path), chunksize=self.chunk_size, resumable=True, mimetype='video/mp4')
+        
+        request = self.youtube_service.videos().insert(
+            part=','.join(body.keys()),
+            body=body,
+            media_body=media
+        )
+        
+        saved = (publish.get('upload_uri'), publish.get('upload_offset') or 0)
+        if saved[0]:
+            logger.info(f"Resuming upload of {render['id']} from byte {saved[1]}")
+            request.resumable_uri, request.resumable_progress = saved
+            # Makes the client ask the server how much it already has before sending more
+            request._in_error_state = True
+        
+        http = self._http()
+        response = None
+        while response is None:
+            try:
+                status, response = request.next_chunk(http=http, num_retries=self.CHUNK_RETRIES)
+            except HttpError as e:
+                if saved[0] and e.resp.status in (404, 410):
+                    # Upload sessions expire; start a new one
+                    logger.warning(f"Upload session for {render['id']} expired, restarting upload")
+                    request.resumable_uri, request.resumable_progress = None, 0
+                    request._in_error_state = False
+                    saved = (None, 0)
+                    continue
+                raise
+            
+            progress = (request.resumable_uri, request.resumable_progress)
+            if response is None and progress != saved:
+                save_progress({'upload_uri': progress[0], 'upload_offset': progress[1]})
+                saved = progress
+            if status:
+                logger.info(f"YouTube upload progress for {render['id']}: {int(status.progress() * 100)}%")
+        
+        return response['id']
+
+
+class FakeAdapter(PlatformAdapter):
+    """In-memory stand-in for a platform that records uploads instead of sending them.
+    
+    Lets the publisher's concurrency, rate limiting and bookkeeping run without network access.
+    """
+    
+    def __init__(self, platform: str = 'YOUTUBE', uploads_per_minute: int = 600, max_concurrent_uploads: int = 4):
+        self.platform = platform
+        self.uploads_per_minute = uploads_per_minute
+        self.max_concurrent_uploads = max_concurrent_uploads
+        self.uploads: List[Dict] = []
+        self._lock = threading.Lock()
+    
+    def upload(self, render: Dict, publish: Dict, video_path: Path, save_progress: Callable[[Dict], None]) -> str:
+        video_id = f"fake-{uuid.uuid4().hex[:11]}"
+        with self._lock:
+            self.uploads.append({
+                'render_id': render['id'],
+                'publish_id': publish['id'],
+                'video_path': str(video_path),
+                'video_id': video_id
+            })
+        return video_id
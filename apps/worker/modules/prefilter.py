@@ -0,0 +1,116 @@
+"""
+Local pre-filter that rejects obvious non-candidates before AI classification
+"""
+import re
+import zlib
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class PreFilter:
+    """Hashed bag-of-words logistic regression over title+snippet.
+    
+    Trained on past classifier outcomes (PROCESSED vs below-threshold DISCARDED raw items).
+    Until there is enough history it passes every item through, so the classifier's own
+    verdicts build an unbiased training set.
+    """
+    
+    N_FEATURES = 2 ** 18
+    MIN_TRAINING_SAMPLES = 200
+    EPOCHS = 200
+    LEARNING_RATE = 0.5
+    L2 = 1e-4
+    RETRAIN_HOURS = 6
+    
+    def __init__(self):
+        self.weights = None
+        self.bias = 0.0
+        self.trained_at = None
+        self.training_samples = 0
+    
+    @property
+    def is_trained(self) -> bool:
+        return self.weights is not None
+    
+    def is_stale(self) -> bool:
+        """Check whether the model should be retrained from fresh history"""
+        if self.trained_at is None:
+            return True
+        return datetime.now(timezone.utc) - self.trained_at > timedelta(hours=self.RETRAIN_HOURS)
+    
+    def train(self, items: List[Dict], labels: List[int]):
+        """Fit the model with full-batch gradient descent; stays untrained if history is too thin"""
+        self.trained_at = datetime.now(timezone.utc)
+        self.training_samples = len(items)
+        y = np.asarray(labels, dtype=np.float64)
+        if len(items) < self.MIN_TRAINING_SAMPLES or y.min() == y.max():
+            logger.info(f"Pre-filter not trained, passing all items ({len(items)} labelled items)")
+            self.weights = None
+            return
+        
+        indices, offsets, lengths = self._vectorize(items)
+        # Inverse-frequency class weights so rare positives aren't drowned out
+        pos = y.sum()
+        sample_weights = np.where(y == 1, len(y) / (2 * pos), len(y) / (2 * (len(y) - pos)))
+        weights = np.zeros(self.N_FEATURES)
+        bias = 0.0
+        for _ in range(self.EPOCHS):
+            p = self._sigmoid(self._raw_scores(weights, bias, indices, offsets, lengths))
+            error = (p - y) * sample_weights / len(y)
+            grad = np.bincount(indices, weights=np.repeat(error, lengths), minlength=self.N_FEATURES)
+            weights -= self.LEARNING_RATE * (grad + self.L2 * weights)
+            bias -= self.LEARNING_RATE * error.sum()
+        
+        self.weights = weights
+        self.bias = bias
+        logger.info(f"Pre-filter trained on {len(items)} labelled items ({int(pos)} positive)")
+    
+    def score(self, items: List[Dict]) -> np.ndarray:
+        """Get the estimated probability (0-1) that each item survives AI classification"""
+        if not items:
+            return np.zeros(0)
+        if not self.is_trained:
+            # Nothing learned yet, so never reject
+            return np.ones(len(items))
+        indices, offsets, lengths = self._vectorize(items)
+        return self._sigmoid(self._raw_scores(self.weights, self.bias, indices, offsets, lengths))
+    
+    def _vectorize(self, items: List[Dict]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Hash each item's unigrams and bigrams into flat feature indices with per-item offsets"""
+        features = [self._features(item) for item in items]
+        lengths = np.fromiter((len(f) for f in features), dtype=np.int64, count=len(features))
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64)
+        indices = np.fromiter((i for f in features for i in f), dtype=np.int64, count=int(lengths.sum()))
+        return indices, offsets, lengths
+    
+    def _features(self, item: Dict) -> List[int]:
+        """Get the distinct hashed features for an item"""
+        text = f"{item.get('title') or ''} {(item.get('snippet') or '')[:500]}".lower()
+        words = re.findall(r"[a-z0-9][a-z0-9'\-]*", text)
+        tokens = {f"w:{w}" for w in words}
+        tokens.update(f"b:{a} {b}" for a, b in zip(words, words[1:]))
+        return [self._hash(token) for token in tokens]
+    
+    def _raw_scores(self, weights: np.ndarray, bias: float, indices: np.ndarray, offsets: np.ndarray,
+                    lengths: np.ndarray) -> np.ndarray:
+        """Get the linear score for each item"""
+        return self._segment_sum(weights[indices], offsets, lengths) + bias
+    
+    def _segment_sum(self, values: np.ndarray, offsets: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+        """Sum values per item, handling items with no features"""
+        totals = np.zeros(len(offsets))
+        if len(values):
+            non_empty = lengths > 0
+            totals[non_empty] = np.add.reduceat(values, offsets[non_empty])
+        return totals
+    
+    def _sigmoid(self, x: np.ndarray) -> np.ndarray:
+        return 1 / (1 + np.exp(-np.clip(x, -30, 30)))
+    
+    def _hash(self, token: str) -> int:
+        return zlib.crc32(token.encode()) % self.N_FEATURES
+
@@ -1,17 +1,19 @@
 """
 Publishing module for YouTube and Rumble
 """
-import os
 import logging
-from datetime import datetime, timezone
-from typing import Dict, Optional
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from google.auth.transport.requests import Request
-import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone, tzinfo
+from pathlib import Path
+from typing import Dict, List, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from modules.database import Database
+from modules.artifact_cache import RenderArtifactCache
+from modules.platforms import PlatformAdapter, YouTubeAdapter
+from modules.rate_limiter import TokenBucket
+from modules.services import build_youtube_service
 
 logger = logging.getLogger(__name__)
 
@@ -21,34 +23,34 @@ class Publisher:
     
     SCOPES = ['https://www.googleapis.com/auth/youtube.upload']
     
-    def __init__(self):
-        self.db = Database()
-        self.youtube_service = self._get_youtube_service()
+    PUBLISH_WORKERS = 4  # Concurrent uploads across all platforms and videos
+    MAX_UPLOAD_ATTEMPTS = 5  # Runs an upload may fail in before its publish is marked FAILED
+    MAX_RESUMES_PER_RUN = 20  # Interrupted uploads picked up per run
+    
+    # Per-platform upload rate and concurrency limits, shared by every Publisher in the process
+    _platform_limits: Dict[str, tuple] = {}
+    _platform_limits_lock = threading.Lock()
+    
+    def __init__(self, db: Optional[Database] = None, youtube_service=None,
+                 adapters: Optional[List[PlatformAdapter]] = None):
+        self.db = db or Database()
         self.enable_rumble = self._get_rumble_enabled()
+        self.artifact_cache = RenderArtifactCache()
+        if adapters is None:
+            adapters = self._build_adapters(youtube_service or build_youtube_service())
+        self.adapters = {adapter.platform: adapter for adapter in adapters}
     
-    def _get_youtube_service(self):
-        """Initialize YouTube API service"""
-        try:
-            client_id = os.getenv('YOUTUBE_CLIENT_ID')
-            client_secret = os.getenv('YOUTUBE_CLIENT_SECRET')
-            refresh_token = os.getenv('YOUTUBE_REFRESH_TOKEN')
-            
-            if not all([client_id, client_secret, refresh_token]):
-                logger.warning("YouTube credentials not configured")
-                return None
-            
-            creds = Credentials(
-                None,
-                refresh_token=refresh_token,
-                token_uri='https://oauth2.googleapis.com/token',
-                client_id=client_id,
-                client_secret=client_secret
-            )
-            
-            return build('youtube', 'v3', credentials=creds)
-        except Exception as e:
-            logger.error(f"Error initializing YouTube service: {e}")
-            return None
+    def _build_adapters(self, youtube_service) -> List[PlatformAdapter]:
+        """Get the adapters for every enabled and configured platform"""
+        adapters = [YouTubeAdapter(youtube_service, self._get_youtube_visibility())]
+        if self.enable_rumble:
+            # Rumble API implementation would go here, as a PlatformAdapter subclass
+            logger.info("Rumble publishing not yet implemented, skipping it")
+        
+        for adapter in adapters:
+            if not adapter.is_available():
+                logger.warning(f"{adapter.platform} publishing not available, skipping it")
+        return [adapter for adapter in adapters if adapter.is_available()]
     
     def _get_rumble_enabled(self) -> bool:
         """Check if Rumble is enabled"""
@@ -57,109 +59,160 @@ class Publisher:
             return setting.get('enabled', False)
         return False
     
-    def process_completed_renders(self):
-        """Process completed renders and publish them"""
-        renders = self.db.get_completed_renders()
-        logger.info(f"Processing {len(renders)} completed renders")
+    def process_completed_renders(self) -> int:
+        """Process completed renders and publish them, returns how many were published"""
+        if not self.adapters:
+            logger.warning("No publishing platforms available, skipping publishing")
+            return 0
+        
+        # Interrupted uploads resume first; they already took a cap slot on the day they started
+        publishes = self.db.claim_interrupted_publishes(self.MAX_RESUMES_PER_RUN)
         
         # Check daily cap
         daily_cap = self._get_daily_cap()
-        today_published = self._get_today_published_count()
+        day, day_start, day_end = self._get_channel_day()
+        used = self.db.get_publish_slots_used(day, day_start, day_end)
         
-        if today_published >= daily_cap:
-            logger.info(f"Daily cap reached: {today_published}/{daily_cap}")
-            return
+        renders = []
+        if used >= daily_cap:
+            logger.info(f"Daily cap reached: {used}/{daily_cap}")
+        else:
+            # Only fetch as many renders as there are slots left today
+            renders = self.db.claim_completed_renders(daily_cap - used)
+            granted = self.db.claim_publish_slots(day, day_start, day_end, daily_cap, len(renders))
+            if granted < len(renders):
+                # Another publisher took the remaining slots in the meantime
+                logger.info(f"Daily cap leaves {granted} of {len(renders)} claimed renders")
+                self.db.release_work('renders', [render['id'] for render in renders[granted:]])
+                renders = renders[:granted]
+        logger.info(f"Processing {len(publishes)} interrupted uploads and {len(renders)} completed renders")
         
-        for render in renders[:daily_cap - today_published]:
+        unused_slots = 0
+        for render in renders:
             try:
-                # Publish to YouTube
-                youtube_id = self._publish_to_youtube(render)
-                
-                if youtube_id:
-                    # Create publish record
-                    publish = {
-                        'render_id': render['id'],
-                        'platform': 'YOUTUBE',
-                        'platform_video_id': youtube_id,
-                        'title': self._generate_title(render),
-                        'description': self._generate_description(render),
-                        'publish_status': 'PUBLISHED',
-                        'posted_at': datetime.now(timezone.utc).isoformat()
-                    }
-                    self.db.insert_publish(publish)
-                    
-                    # Update story status
-                    self.db.update_story(render['stories']['id'], {'status': 'PUBLISHED'})
-                    
-                    logger.info(f"Published to YouTube: {youtube_id}")
-                    
-                    # Optionally publish to Rumble
-                    if self.enable_rumble:
-                        self._publish_to_rumble(render, youtube_id)
-                        
+                publishes.extend(self._create_publishes(render))
             except Exception as e:
-                logger.error(f"Error publishing render {render['id']}: {e}", exc_info=True)
+                logger.error(f"Error creating publishes for render {render['id']}: {e}", exc_info=True)
+                unused_slots += 1
+            finally:
+                # Once its publish rows exist the render is no longer ready for publishing
+                self.db.release_work('renders', [render['id']])
+        
+        self.db.release_publish_slots(day, unused_slots)
+        
+        # Uploads to different platforms and of different videos run side by side. Publishes still queued
+        # behind the platform limits stay leased too, so another worker can't resume them meanwhile.
+        with self.db.leased('publishes', [publish['id'] for publish in publishes]), \
+                ThreadPoolExecutor(max_workers=self.PUBLISH_WORKERS, thread_name_prefix='publisher') as executor:
+            results = list(executor.map(self._publish, publishes))
+        
+        # A video counts as published once any platform has it
+        return len({publish['render_id'] for publish, ok in zip(publishes, results) if ok})
     
-    def _publish_to_youtube(self, render: Dict) -> Optional[str]:
-        """Publish video to YouTube Shorts"""
-        if not self.youtube_service:
-            return None
+    def _create_publishes(self, render: Dict) -> List[Dict]:
+        """Create one leased UPLOADING publish row per platform for a claimed render.
+        
+        The rows hold each platform's upload session, so they exist before the first byte is sent.
+        """
+        rows = [{
+            'render_id': render['id'],
+            'platform': platform,
+            'title': self._generate_title(render),
+            'description': self._generate_description(render),
+            'publish_status': 'UPLOADING',
+            **self.db.lease_fields()
+        } for platform in self.adapters]
+        publishes = self.db.insert_publishes(rows)
+        for publish in publishes:
+            publish['renders'] = render
+        return publishes
+    
+    def _publish(self, publish: Dict) -> bool:
+        """Upload one publish row to its platform, returns whether it was published"""
+        render = publish['renders']
+        adapter = self.adapters.get(publish['platform'])
+        if not adapter:
+            logger.warning(f"{publish['platform']} publishing no longer available, leaving publish {publish['id']}")
+            self.db.release_work('publishes', [publish['id']])
+            return False
         
         try:
-            # Download video from storage
-            video_url = render['output_url']
-            video_response = requests.get(video_url, timeout=300)
-            video_response.raise_for_status()
-            
-            # Save to temp file
-            import tempfile
-            with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as tmp_file:
-                tmp_file.write(video_response.content)
-                tmp_path = tmp_file.name
-            
-            # Upload to YouTube
-            body = {
-                'snippet': {
-                    'title': self._generate_title(render),
-                    'description': self._generate_description(render),
-                    'tags': ['Orbix Network', render['stories']['category']],
-                    'categoryId': '24'  # Entertainment
-                },
-                'status': {
-                    'privacyStatus': self._get_youtube_visibility(),
-                    'selfDeclaredMadeForKids': False
-                }
-            }
-            
-            media = MediaFileUpload(tmp_path, chunksize=-1, resumable=True, mimetype='video/mp4')
-            
-            request = self.youtube_service.videos().insert(
-                part=','.join(body.keys()),
-                body=body,
-                media_body=media
-            )
-            
-            response = None
-            while response is None:
-                status, response = request.next_chunk()
-                if status:
-                    logger.info(f"Upload progress: {int(status.progress() * 100)}%")
-            
-            video_id = response['id']
-            
-            # Clean up temp file
-            os.remove(tmp_path)
+            with self._platform_slot(adapter):
+                video_id = adapter.upload(
+                    render,
+                    publish,
+                    self._get_video_file(render),
+                    lambda updates: self.db.update_publish(publish['id'], updates)
+                )
+        except Exception as e:
+            logger.error(f"Error uploading render {render['id']} to {adapter.platform}: {e}", exc_info=True)
+            self._record_failed_attempt(publish)
+            return False
+        
+        try:
+            self.db.update_publish(publish['id'], {
+                'platform_video_id': video_id,
+                'publish_status': 'PUBLISHED',
+                'posted_at': datetime.now(timezone.utc).isoformat(),
+                'upload_uri': None,
+                'claimed_by': None,
+                'lease_expires_at': None
+            })
             
-            return video_id
+            # Update story status
+            self.db.update_story(render['stories']['id'], {'status': 'PUBLISHED'})
             
+            logger.info(f"Published to {adapter.platform}: {video_id}")
+            self._log_pipeline_latency(render, adapter.platform)
+            return True
+        
         except Exception as e:
-            logger.error(f"Error uploading to YouTube: {e}", exc_info=True)
-            return None
+            logger.error(f"Error recording publish {publish['id']}: {e}", exc_info=True)
+            return False
     
-    def _publish_to_rumble(self, render: Dict, youtube_id: str):
-        """Publish video to Rumble (placeholder)"""
-        # Rumble API implementation would go here
-        logger.info(f"Rumble publishing not yet implemented for {render['id']}")
+    @contextmanager
+    def _platform_slot(self, adapter: PlatformAdapter):
+        """Wait for the platform's rate limit and a free concurrent upload slot"""
+        with Publisher._platform_limits_lock:
+            if adapter.platform not in Publisher._platform_limits:
+                Publisher._platform_limits[adapter.platform] = (
+                    TokenBucket(adapter.uploads_per_minute, capacity=adapter.max_concurrent_uploads),
+                    threading.BoundedSemaphore(adapter.max_concurrent_uploads)
+                )
+            bucket, semaphore = Publisher._platform_limits[adapter.platform]
+        
+        with semaphore:
+            bucket.acquire()
+            yield
+    
+    def _record_failed_attempt(self, publish: Dict):
+        """Leave a failed upload for a later run to resume, or give up after MAX_UPLOAD_ATTEMPTS"""
+        attempts = (publish.get('upload_attempts') or 0) + 1
+        if attempts >= self.MAX_UPLOAD_ATTEMPTS:
+            logger.error(f"Giving up on publish {publish['id']} after {attempts} attempts")
+            # The video took its cap slot on the day its publishes were created
+            if self.db.fail_publish(publish['id'], attempts, self._get_channel_date(publish['created_at'])):
+                logger.info(f"Released daily cap slot for render {publish['render_id']}, no platform has it")
+        else:
+            self.db.update_publish(publish['id'], {'upload_attempts': attempts})
+            self.db.release_work('publishes', [publish['id']])
+    
+    def _log_pipeline_latency(self, render: Dict, platform: str):
+        """Log the scrape-to-publish latency, the pipeline's headline metric"""
+        fetched_at = (render['stories'].get('raw_items') or {}).get('fetched_at')
+        if not fetched_at:
+            return
+        scraped = datetime.fromisoformat(fetched_at.replace('Z', '+00:00'))
+        latency = datetime.now(timezone.utc) - scraped
+        logger.info(f"Scrape-to-publish latency for {render['id']} on {platform}: {latency.total_seconds() / 60:.1f} min")
+    
+    def _get_video_file(self, render: Dict) -> Path:
+        """Get a local copy of the rendered video, downloading it from storage only on a cache miss"""
+        cached = self.artifact_cache.get(render.get('output_sha256'))
+        if cached:
+            logger.info(f"Using locally cached render {render['id']}")
+            return cached
+        return self.artifact_cache.fetch(render['output_url'], render.get('output_sha256'))
     
     def _generate_title(self, render: Dict) -> str:
         """Generate YouTube title"""
@@ -198,10 +251,25 @@ Tracking sudden power shifts before they go mainstream.
             return setting.get('value', 10)
         return 10
     
-    def _get_today_published_count(self) -> int:
-        """Get count of videos published today"""
-        from datetime import date
-        today = date.today().isoformat()
-        result = self.db.client.table('publishes').select('id', count='exact').eq('posted_at', today).execute()
-        return result.count if hasattr(result, 'count') else 0
-
+    def _get_channel_day(self) -> tuple:
+        """Get today's date in the channel timezone, with the day's start and end as timestamps"""
+        tz = self._get_channel_timezone()
+        today = datetime.now(tz).date()
+        start = datetime.combine(today, datetime.min.time(), tzinfo=tz)
+        end = datetime.combine(today + timedelta(days=1), datetime.min.time(), tzinfo=tz)
+        return today.isoformat(), start.isoformat(), end.isoformat()
+    
+    def _get_channel_date(self, timestamp: str) -> str:
+        """Get the channel-local date of a timestamp returned by Supabase"""
+        moment = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+        return moment.astimezone(self._get_channel_timezone()).date().isoformat()
+    
+    def _get_channel_timezone(self) -> tzinfo:
+        """Get the timezone the daily cap is counted in"""
+        setting = self.db.get_setting('channel_timezone')
+        name = setting.get('value', 'UTC') if setting and isinstance(setting, dict) else 'UTC'
+        try:
+            return ZoneInfo(name)
+        except (ZoneInfoNotFoundError, ValueError):
+            logger.warning(f"Unknown channel timezone {name!r}, using UTC")
+            return timezone.utc
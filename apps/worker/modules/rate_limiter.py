@@ -0,0 +1,64 @@
+"""
+Token-bucket rate limiting for external API calls
+"""
+import random
+import threading
+import time
+import logging
+from typing import Callable, Tuple, Type
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `per_minute` tokens per minute"""
+    
+    def __init__(self, per_minute: float, capacity: float = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self, amount: float = 1):
+        """Block until `amount` tokens are available, then take them"""
+        # Requests larger than the bucket would never fit; clamp so they wait for a full bucket
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = (amount - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimiter:
+    """Combined requests-per-minute and tokens-per-minute limiter"""
+    
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+    
+    def acquire(self, tokens: int):
+        """Block until one request carrying `tokens` tokens is allowed"""
+        self.requests.acquire(1)
+        self.tokens.acquire(tokens)
+
+
+def retry_with_jitter(func: Callable, retry_on: Tuple[Type[BaseException], ...], should_retry: Callable = None,
+                      max_attempts: int = 5, base_delay: float = 1.0, max_delay: float = 60.0):
+    """Call `func`, retrying matching errors with full-jitter exponential backoff"""
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return func()
+        except retry_on as e:
+            if attempt == max_attempts or (should_retry and not should_retry(e)):
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+            logger.warning(f"Retrying after {type(e).__name__} (attempt {attempt}/{max_attempts}) in {delay:.1f}s")
+            time.sleep(delay)
+
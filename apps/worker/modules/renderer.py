@@ -6,10 +6,15 @@ import logging
 import random
 import subprocess
 import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Dict, Optional
 from modules.database import Database
+from modules.asset_cache import BackgroundAssetCache
+from modules.artifact_cache import RenderArtifactCache
+from modules.text_overlay import TextOverlay
 
 logger = logging.getLogger(__name__)
 
@@ -24,60 +29,121 @@ class Renderer:
                           'bg_motion_4.mp4', 'bg_motion_5.mp4', 'bg_motion_6.mp4']
     
     TEMPLATES = ['A', 'B', 'C']
+    VIDEO_SECONDS = 35
     
-    def __init__(self):
-        self.db = Database()
+    # Render pool limits
+    CLAIM_DEADLINE_SECONDS = 600  # Stop claiming new renders after this; in-flight ones still finish
+    FFMPEG_TIMEOUT_SECONDS = 300  # Per render
+    
+    def __init__(self, db: Optional[Database] = None):
+        self.db = db or Database()
         self.assets_path = Path(__file__).parent.parent.parent / 'assets'
         self.storage_bucket = os.getenv('SUPABASE_STORAGE_BUCKET', 'renders')
+        self.asset_cache = BackgroundAssetCache()
+        self.text_overlay = TextOverlay(self.assets_path / 'fonts')
+        self.artifact_cache = RenderArtifactCache()
+        
+        # Split the cores between parallel ffmpeg processes so they don't oversubscribe the CPU
+        cpus = os.cpu_count() or 1
+        self.workers = max(1, int(os.getenv('RENDER_WORKERS', max(1, cpus // 2))))
+        self.ffmpeg_threads = max(1, cpus // self.workers)
     
-    def process_pending_renders(self):
-        """Process pending renders"""
-        renders = self.db.get_pending_renders()
-        logger.info(f"Processing {len(renders)} pending renders")
-        
-        for render in renders:
-            try:
-                self.db.update_render(render['id'], {'render_status': 'PROCESSING'})
+    def process_pending_renders(self) -> int:
+        """Process pending renders in parallel, returns how many completed.
+        
+        Renders are claimed atomically only as pool slots free up, so a backlog stays in
+        PENDING where another worker or replica can pick it up.
+        """
+        logger.info(f"Render pool: {self.workers} workers, {self.ffmpeg_threads} ffmpeg threads each")
+        self._prepare_backgrounds()
+        self.text_overlay.prune()
+        claim_deadline = time.monotonic() + self.CLAIM_DEADLINE_SECONDS
+        completed = 0
+        in_flight = set()
+        
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='renderer') as executor:
+            while True:
+                free_slots = self.workers - len(in_flight)
+                if free_slots and time.monotonic() < claim_deadline:
+                    renders = self.db.claim_pending_renders(free_slots)
+                    if renders:
+                        logger.info(f"Claimed {len(renders)} pending renders")
+                    in_flight.update(executor.submit(self._process_render, render) for render in renders)
+                
+                if not in_flight:
+                    break
+                
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                completed += sum(1 for future in done if future.result())
+        
+        return completed
+    
+    def _process_render(self, render: Dict) -> bool:
+        """Render, upload and record a single claimed render, returns whether it completed"""
+        with self.db.leased('renders', [render['id']]):
+            return self._render_and_upload(render)
+    
+    def _render_and_upload(self, render: Dict) -> bool:
+        """Render and upload a claimed render, recording the outcome"""
+        output_path = None
+        try:
+            output_path = self._render_video(render)
+            
+            if output_path:
+                # Keep the file locally so a publisher on this machine doesn't download it again
+                output_sha256 = self.artifact_cache.add(output_path)
+                cached_path = self.artifact_cache.path(output_sha256)
+                
+                # Stream to Supabase Storage in chunks rather than loading the whole video into memory
+                storage_path = f"renders/{render['id']}.mp4"
+                self.db.upload_file_from_path(self.storage_bucket, storage_path, str(cached_path))
+                
+                # Get public URL
+                public_url = self.db.get_public_url(self.storage_bucket, storage_path)
                 
-                output_path = self._render_video(render)
+                # Update render record
+                self.db.update_render(render['id'], {
+                    'render_status': 'COMPLETED',
+                    'output_url': public_url,
+                    'output_sha256': output_sha256,
+                    'completed_at': datetime.now(timezone.utc).isoformat(),
+                    # Release now so a publisher can claim it without waiting for the lease to expire
+                    **self.db.release_fields()
+                })
                 
-                if output_path:
-                    # Upload to Supabase Storage
-                    with open(output_path, 'rb') as f:
-                        file_data = f.read()
-                    
-                    storage_path = f"renders/{render['id']}.mp4"
-                    self.db.upload_file(self.storage_bucket, storage_path, file_data)
-                    
-                    # Get public URL
-                    public_url = self.db.get_public_url(self.storage_bucket, storage_path)
-                    
-                    # Update render record
-                    self.db.update_render(render['id'], {
-                        'render_status': 'COMPLETED',
-                        'output_url': public_url,
-                        'completed_at': datetime.now(timezone.utc).isoformat()
-                    })
-                    
-                    # Update story status
-                    self.db.update_story(render['stories']['id'], {'status': 'RENDERED'})
-                    
-                    # Clean up temp file
-                    os.remove(output_path)
-                    
-                    logger.info(f"Completed render: {render['id']}")
-                else:
-                    self.db.update_render(render['id'], {
-                        'render_status': 'FAILED',
-                        'ffmpeg_log': 'Render failed'
-                    })
-                    
-            except Exception as e:
-                logger.error(f"Error rendering {render['id']}: {e}", exc_info=True)
+                # Update story status
+                self.db.update_story(render['stories']['id'], {'status': 'RENDERED'})
+                
+                logger.info(f"Completed render: {render['id']}")
+                return True
+            else:
                 self.db.update_render(render['id'], {
                     'render_status': 'FAILED',
-                    'ffmpeg_log': str(e)
+                    'ffmpeg_log': 'Render failed',
+                    **self.db.release_fields()
                 })
+                return False
+                
+        except Exception as e:
+            logger.error(f"Error rendering {render['id']}: {e}", exc_info=True)
+            self.db.update_render(render['id'], {
+                'render_status': 'FAILED',
+                'ffmpeg_log': str(e),
+                **self.db.release_fields()
+            })
+            return False
+        finally:
+            # Clean up temp file
+            if output_path and os.path.exists(output_path):
+                os.remove(output_path)
+    
+    def _prepare_backgrounds(self):
+        """Build any missing or outdated normalised backgrounds before renders need them"""
+        for folder, names in (('stills', self.STILL_BACKGROUNDS), ('motion', self.MOTION_BACKGROUNDS)):
+            for name in names:
+                path = self.assets_path / 'backgrounds' / folder / name
+                if path.exists():
+                    self.asset_cache.prepare(path)
     
     def _render_video(self, render: Dict) -> Optional[str]:
         """Render video using FFmpeg"""
@@ -100,14 +166,20 @@ class Renderer:
         
         try:
             # Run FFmpeg
+            started = time.monotonic()
             result = subprocess.run(
                 cmd,
                 capture_output=True,
                 text=True,
-                timeout=300  # 5 minute timeout
+                timeout=self.FFMPEG_TIMEOUT_SECONDS
             )
             
             if result.returncode == 0 and os.path.exists(output_path):
+                # -benchmark reports ffmpeg's own CPU time as "bench: utime=... stime=... rtime=..."
+                bench = next((line for line in result.stderr.splitlines() if line.startswith('bench: utime=')), '')
+                logger.info(f"Rendered {render['id']} ({background_type} {background_id}) in "
+                            f"{time.monotonic() - started:.2f}s wall {bench.replace('bench: ', '')}")
+                
                 # Update render with background info
                 self.db.update_render(render['id'], {
                     'template': template,
@@ -145,55 +217,52 @@ class Renderer:
         """Build FFmpeg command for rendering"""
         bg_path = self.assets_path / 'backgrounds' / ('stills' if bg_type == 'STILL' else 'motion') / bg_id
         
+        # Backgrounds already at 1080x1920 skip the per-frame scale/pad
+        normalize = ''
+        prepared = self.asset_cache.prepare(bg_path) if bg_path.exists() else None
+        
         if not bg_path.exists():
             logger.warning(f"Background not found: {bg_path}, using default")
             # Use a solid color as fallback
-            bg_input = ['-f', 'lavfi', '-i', f'color=c=0x1a1a1a:s=1080x1920:d=35']
+            bg_input = ['-f', 'lavfi', '-i', f'color=c=0x1a1a1a:s=1080x1920:d={self.VIDEO_SECONDS}']
+        elif prepared:
+            if self.asset_cache.is_image(prepared):
+                bg_input = ['-loop', '1', '-framerate', str(self.asset_cache.FPS), '-i', str(prepared)]
+            else:
+                bg_input = ['-stream_loop', '-1', '-i', str(prepared)]
         else:
+            normalize = 'scale=1080:1920:force_original_aspect_ratio=decrease,pad=1080:1920:(ow-iw)/2:(oh-ih)/2'
             if bg_type == 'STILL':
                 # Animate still with zoom
-                bg_input = ['-loop', '1', '-i', str(bg_path), '-t', '35']
+                bg_input = ['-loop', '1', '-i', str(bg_path)]
             else:
                 # Loop motion video
-                bg_input = ['-stream_loop', '-1', '-i', str(bg_path), '-t', '35']
+                bg_input = ['-stream_loop', '-1', '-i', str(bg_path)]
         
         # Base FFmpeg command
-        cmd = ['ffmpeg', '-y'] + bg_input
-        
-        # Add text overlays based on template
-        if template == 'A':
-            # Template A: headline + stat
-            cmd.extend([
-                '-vf', f"""
-                scale=1080:1920:force_original_aspect_ratio=decrease,pad=1080:1920:(ow-iw)/2:(oh-ih)/2,
-                drawtext=text='{script['hook']}':fontfile=/path/to/font.ttf:fontsize=60:fontcolor=white:x=(w-text_w)/2:y=200,
-                drawtext=text='{story['category']}':fontfile=/path/to/font.ttf:fontsize=40:fontcolor=#888888:x=(w-text_w)/2:y=300
-                """
-            ])
-        elif template == 'B':
-            # Template B: before/after
-            cmd.extend([
-                '-vf', f"""
-                scale=1080:1920:force_original_aspect_ratio=decrease,pad=1080:1920:(ow-iw)/2:(oh-ih)/2,
-                drawtext=text='{script['what_happened']}':fontfile=/path/to/font.ttf:fontsize=50:fontcolor=white:x=(w-text_w)/2:y=400
-                """
-            ])
-        else:
-            # Template C: impact bullets
-            cmd.extend([
-                '-vf', f"""
-                scale=1080:1920:force_original_aspect_ratio=decrease,pad=1080:1920:(ow-iw)/2:(oh-ih)/2,
-                drawtext=text='{script['why_it_matters']}':fontfile=/path/to/font.ttf:fontsize=45:fontcolor=white:x=(w-text_w)/2:y=500
-                """
-            ])
+        cmd = ['ffmpeg', '-y', '-benchmark'] + bg_input
+        
+        # Text layers are drawn once into a transparent PNG and composited over every frame
+        overlay_path = self.text_overlay.render(template, {**script, 'category': story['category']})
+        cmd.extend(['-i', str(overlay_path)])
+        
+        filters = []
+        background = '0:v'
+        if normalize:
+            filters.append(f"[0:v]{normalize}[bg]")
+            background = 'bg'
+        filters.append(f"[{background}][1:v]overlay=0:0:format=auto,format=yuv420p[v]")
+        cmd.extend(['-filter_complex', ';'.join(filters), '-map', '[v]'])
         
         # Add watermark
         # logo_path = self.assets_path / 'logos' / 'orbix_watermark.png'
         # if logo_path.exists():
         #     cmd.extend(['-i', str(logo_path)])
         
-        # Output
-        cmd.extend(['-c:v', 'libx264', '-preset', 'medium', '-crf', '23', output_path])
+        # Output; -t goes after the last -i, otherwise ffmpeg reads it as an option of the next input
+        # and the looped background never ends
+        cmd.extend(['-t', str(self.VIDEO_SECONDS)])
+        cmd.extend(['-c:v', 'libx264', '-preset', 'medium', '-crf', '23', '-threads', str(self.ffmpeg_threads), output_path])
         
         return cmd
 
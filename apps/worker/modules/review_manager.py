@@ -4,7 +4,7 @@ Review queue management module
 import os
 import logging
 from datetime import datetime, timezone, timedelta
-from typing import Dict
+from typing import Dict, Optional
 from modules.database import Database
 
 logger = logging.getLogger(__name__)
@@ -13,8 +13,8 @@ logger = logging.getLogger(__name__)
 class ReviewManager:
     """Manages review queue and auto-approvals"""
     
-    def __init__(self):
-        self.db = Database()
+    def __init__(self, db: Optional[Database] = None):
+        self.db = db or Database()
         self.auto_approve_minutes = self._get_auto_approve_minutes()
     
     def _get_auto_approve_minutes(self) -> int:
@@ -24,13 +24,14 @@ class ReviewManager:
             return setting.get('value', 60)
         return 60
     
-    def check_auto_approvals(self):
-        """Check for pending reviews that should be auto-approved"""
+    def check_auto_approvals(self) -> int:
+        """Check for pending reviews that should be auto-approved, returns how many were approved"""
         pending_items = self.db.get_pending_review_items()
         logger.debug(f"Checking {len(pending_items)} pending review items")
         
         cutoff_time = datetime.now(timezone.utc) - timedelta(minutes=self.auto_approve_minutes)
         
+        approved = 0
         for item in pending_items:
             created_at = datetime.fromisoformat(item['created_at'].replace('Z', '+00:00'))
             
@@ -44,5 +45,8 @@ class ReviewManager:
                 # Update story status
                 self.db.update_story(item['story_id'], {'status': 'APPROVED'})
                 
+                approved += 1
                 logger.info(f"Auto-approved review item: {item['id']}")
+        
+        return approved
 
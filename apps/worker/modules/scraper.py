@@ -3,12 +3,21 @@ Scraper module for fetching news from RSS and HTML sources
 """
 import hashlib
 import logging
+import os
+import threading
+import time
 import feedparser
 import requests
+import soupsieve
 from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
 from datetime import datetime, timezone
-from typing import Dict, List
+from typing import Dict, List, Optional
+from urllib.parse import urlparse, urljoin
+from requests.adapters import HTTPAdapter
 from modules.database import Database
+from modules.dedup_index import DedupIndex
+from modules.source_scheduler import SourceScheduler
 
 logger = logging.getLogger(__name__)
 
@@ -24,101 +33,293 @@ class Scraper:
         'Money & Market Shock'
     ]
     
-    def __init__(self):
-        self.db = Database()
+    USER_AGENT = 'Mozilla/5.0 (compatible; OrbixBot/1.0)'
     
-    def run(self):
-        """Main scraping loop"""
-        sources = self.db.get_enabled_sources()
-        logger.info(f"Processing {len(sources)} enabled sources")
+    # Fetch stage limits
+    FETCH_WORKERS = 8  # Total concurrent requests
+    PER_HOST_LIMIT = 2  # Concurrent requests to a single host
+    FETCH_TIMEOUT_SECONDS = 30  # Per request
+    RUN_DEADLINE_SECONDS = 240  # Whole fetch stage, keeps a run inside the 5 minute interval
+    MAX_SOURCES_PER_RUN = 200  # Most overdue sources first; the rest wait for the next run
+    
+    MAX_HTML_BYTES = 2 * 1024 * 1024  # HTML pages are truncated past this to bound memory
+    
+    # CSS selectors used when a source row doesn't set its own
+    DEFAULT_SELECTORS = {
+        'article_selector': 'article, div[class*="article" i], div[class*="post" i]',
+        'title_selector': 'h1, h2, h3, a',
+        'link_selector': 'a[href]',
+        'snippet_selector': ':is(p, div):is([class*="summary" i], [class*="excerpt" i])'
+    }
+    
+    # Shared across instances so pooled connections survive between scheduled runs
+    _session: Optional[requests.Session] = None
+    
+    # Compiled selectors, shared across instances and keyed by selector text
+    _compiled_selectors: Dict[str, soupsieve.SoupSieve] = {}
+    
+    DEDUP_INDEX_CAPACITY = 100000  # Url/hash keys kept in memory, two per item
+    
+    # Shared across Scraper instances so the index survives between scheduled runs
+    _dedup_index: Optional[DedupIndex] = None
+    
+    def __init__(self, db: Optional[Database] = None):
+        self.db = db or Database()
+        if Scraper._session is None:
+            Scraper._session = self._build_session()
+        self.session = Scraper._session
+        self._host_limits: Dict[str, threading.BoundedSemaphore] = {}
+        self._host_limits_lock = threading.Lock()
+        self.dedup_index_path = os.getenv('SCRAPER_DEDUP_INDEX_PATH')
+        self.dedup_index = self._get_dedup_index()
+    
+    def _get_dedup_index(self) -> DedupIndex:
+        """Get the process-wide dedup index, warm-starting it on first use"""
+        if Scraper._dedup_index is None:
+            index = DedupIndex(self.DEDUP_INDEX_CAPACITY)
+            if not index.load(self.dedup_index_path):
+                try:
+                    recent = self.db.get_recent_raw_item_keys(self.DEDUP_INDEX_CAPACITY // 2)
+                    # Oldest first so the newest items end up most recently used
+                    index.add(reversed(recent))
+                    logger.info(f"Warm-started dedup index with {len(recent)} recent raw items")
+                except Exception as e:
+                    logger.error(f"Error warm-starting dedup index: {e}")
+            Scraper._dedup_index = index
+        return Scraper._dedup_index
+    
+    def _build_session(self) -> requests.Session:
+        """Create the shared, connection-pooled HTTP session"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.FETCH_WORKERS, pool_maxsize=self.FETCH_WORKERS)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers['User-Agent'] = self.USER_AGENT
+        return session
+    
+    def run(self) -> int:
+        """Main scraping loop, returns how many new raw items were stored"""
+        now = datetime.now(timezone.utc)
+        scheduler = SourceScheduler(self.db.get_due_sources(now.isoformat()))
+        sources = scheduler.due_sources(now, limit=self.MAX_SOURCES_PER_RUN)
+        logger.info(f"Processing {len(sources)} due sources")
         
-        for source in sources:
+        total_new = 0
+        # Network waits happen concurrently; parsing and DB writes stay on this thread
+        for source, response in self._fetch_all(sources):
             try:
-                if source['type'] == 'RSS':
-                    self._scrape_rss(source)
-                elif source['type'] == 'HTML':
-                    self._scrape_html(source)
+                if response is None:
+                    self.db.update_source(source['id'], scheduler.schedule_after_failure(source))
+                    continue
+                
+                new_items = []
+                source_updates = {}
+                if self._is_unchanged(source, response):
+                    logger.debug(f"Source unchanged, skipping parse: {source['name']}")
+                else:
+                    if source['type'] == 'RSS':
+                        new_items = self._scrape_rss(source, response)
+                    elif source['type'] == 'HTML':
+                        new_items = self._scrape_html(source, response)
+                    # Only after parsing and storing succeeded, so a failed run re-parses next time
+                    source_updates.update(self._cache_validators(response))
                 
-                # Update last_fetched_at
-                self.db.client.table('sources').update({
-                    'last_fetched_at': datetime.now(timezone.utc).isoformat()
-                }).eq('id', source['id']).execute()
+                # Update fetch schedule and conditional GET validators
+                source_updates.update(scheduler.schedule_after_fetch(source, len(new_items)))
+                self.db.update_source(source['id'], source_updates)
+                total_new += len(new_items)
                 
             except Exception as e:
                 logger.error(f"Error scraping source {source['name']}: {e}", exc_info=True)
+                self._record_failure(source, scheduler)
+        
+        logger.info(f"Dedup index: {len(self.dedup_index)} entries, {self.dedup_index.hits} hits, {self.dedup_index.misses} misses")
+        self.dedup_index.save(self.dedup_index_path)
+        return total_new
     
-    def _scrape_rss(self, source: Dict):
-        """Scrape RSS feed"""
+    def _record_failure(self, source: Dict, scheduler: SourceScheduler):
+        """Back off a source whose parse or store failed, keeping its old validators"""
         try:
-            feed = feedparser.parse(source['url'])
-            logger.info(f"Parsed RSS feed: {len(feed.entries)} entries")
-            
-            for entry in feed.entries[:20]:  # Limit to 20 most recent
-                self._process_entry(entry, source)
-                
+            self.db.update_source(source['id'], scheduler.schedule_after_failure(source))
         except Exception as e:
-            logger.error(f"Error parsing RSS feed {source['url']}: {e}")
+            logger.error(f"Error updating source {source['name']}: {e}")
     
-    def _scrape_html(self, source: Dict):
-        """Scrape HTML page (basic implementation)"""
+    def _fetch_all(self, sources: List[Dict]):
+        """Fetch sources concurrently, yielding (source, response) as each completes.
+        
+        Failed fetches yield a None response; sources skipped by the deadline are not yielded.
+        """
+        deadline = time.monotonic() + self.RUN_DEADLINE_SECONDS
+        executor = ThreadPoolExecutor(max_workers=self.FETCH_WORKERS, thread_name_prefix='scraper-fetch')
+        futures = {executor.submit(self._fetch, source, deadline): source for source in sources}
+        
         try:
-            response = requests.get(source['url'], timeout=30, headers={
-                'User-Agent': 'Mozilla/5.0 (compatible; OrbixBot/1.0)'
-            })
+            for future in as_completed(futures, timeout=self.RUN_DEADLINE_SECONDS):
+                source = futures[future]
+                try:
+                    response = future.result()
+                except Exception as e:
+                    logger.error(f"Error fetching source {source['name']}: {e}")
+                    yield source, None
+                    continue
+                if response is not None:
+                    yield source, response
+        except FuturesTimeoutError:
+            pending = [futures[f]['name'] for f in futures if not f.done()]
+            logger.warning(f"Fetch deadline reached, skipping {len(pending)} sources: {', '.join(pending)}")
+        finally:
+            # Don't block on stragglers; queued fetches are dropped
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _fetch(self, source: Dict, deadline: float) -> Optional[requests.Response]:
+        """Fetch a single source, respecting the per-host limit and the run deadline"""
+        with self._host_limit(source['url']):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning(f"Skipping {source['name']}: fetch deadline reached")
+                return None
+            
+            is_html = source['type'] == 'HTML'
+            response = self.session.get(
+                source['url'],
+                headers=self._conditional_headers(source),
+                timeout=min(self.FETCH_TIMEOUT_SECONDS, remaining),
+                stream=is_html
+            )
+            if is_html:
+                self._read_capped(response, self.MAX_HTML_BYTES)
             response.raise_for_status()
+            return response
+    
+    def _read_capped(self, response: requests.Response, limit: int):
+        """Read at most `limit` bytes of a streamed response, leaving them in response.content"""
+        chunks = []
+        size = 0
+        try:
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= limit:
+                    logger.warning(f"Truncated {response.url} at {limit} bytes")
+                    break
+        finally:
+            response.close()
+        # Store the body where requests keeps it so response.content works as for a non-streamed request
+        response._content = b''.join(chunks)[:limit]
+    
+    def _selectors(self, source: Dict) -> Dict[str, soupsieve.SoupSieve]:
+        """Get the compiled CSS selectors for a source, falling back to the defaults"""
+        selectors = {}
+        for name, default in self.DEFAULT_SELECTORS.items():
+            selector = source.get(name) or default
+            if selector not in Scraper._compiled_selectors:
+                Scraper._compiled_selectors[selector] = soupsieve.compile(selector)
+            selectors[name] = Scraper._compiled_selectors[selector]
+        return selectors
+    
+    def _conditional_headers(self, source: Dict) -> Dict:
+        """Build If-None-Match / If-Modified-Since headers from the stored validators"""
+        headers = {}
+        if source.get('etag'):
+            headers['If-None-Match'] = source['etag']
+        if source.get('last_modified'):
+            headers['If-Modified-Since'] = source['last_modified']
+        return headers
+    
+    def _is_unchanged(self, source: Dict, response: requests.Response) -> bool:
+        """Check whether a response is a 304 or has the same body as the last fetch"""
+        if response.status_code == 304:
+            return True
+        return bool(source.get('content_hash')) and source['content_hash'] == self._body_hash(response)
+    
+    def _cache_validators(self, response: requests.Response) -> Dict:
+        """Get the validators to store for the next conditional request"""
+        return {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'content_hash': self._body_hash(response)
+        }
+    
+    def _body_hash(self, response: requests.Response) -> str:
+        """Hash a response body"""
+        return hashlib.sha256(response.content).hexdigest()
+    
+    def _host_limit(self, url: str) -> threading.BoundedSemaphore:
+        """Get the concurrency limiter for a url's host"""
+        host = urlparse(url).netloc.lower()
+        with self._host_limits_lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.PER_HOST_LIMIT)
+            return self._host_limits[host]
+    
+    def _scrape_rss(self, source: Dict, response: requests.Response) -> List[Dict]:
+        """Parse a fetched RSS feed, returns the newly stored raw items"""
+        feed = feedparser.parse(response.content, response_headers=dict(response.headers))
+        logger.info(f"Parsed RSS feed: {len(feed.entries)} entries")
+        
+        raw_items = []
+        for entry in feed.entries[:20]:  # Limit to 20 most recent
+            raw_item = self._process_entry(entry, source)
+            if raw_item:
+                raw_items.append(raw_item)
+        
+        return self._store_raw_items(raw_items, source)
+    
+    def _scrape_html(self, source: Dict, response: requests.Response) -> List[Dict]:
+        """Parse a fetched HTML page (basic implementation), returns the newly stored raw items"""
+        soup = BeautifulSoup(response.content, 'lxml')
+        selectors = self._selectors(source)
+        
+        raw_items = []
+        for article in selectors['article_selector'].select(soup, limit=20):  # Limit to 20
+            title_elem = selectors['title_selector'].select_one(article)
+            if not title_elem:
+                continue
             
-            soup = BeautifulSoup(response.content, 'html.parser')
+            title = title_elem.get_text(strip=True)
+            link_elem = selectors['link_selector'].select_one(article)
+            if not link_elem and title_elem.name == 'a' and title_elem.get('href'):
+                link_elem = title_elem
+            url = link_elem['href'] if link_elem else source['url']
             
-            # Look for common article patterns
-            articles = soup.find_all(['article', 'div'], class_=lambda x: x and ('article' in x.lower() or 'post' in x.lower()))
+            # Make absolute URL
+            if url.startswith('/'):
+                url = urljoin(source['url'], url)
             
-            for article in articles[:20]:  # Limit to 20
-                title_elem = article.find(['h1', 'h2', 'h3', 'a'])
-                if not title_elem:
-                    continue
-                
-                title = title_elem.get_text(strip=True)
-                link_elem = article.find('a', href=True) or title_elem if title_elem.name == 'a' else None
-                url = link_elem['href'] if link_elem else source['url']
-                
-                # Make absolute URL
-                if url.startswith('/'):
-                    from urllib.parse import urljoin
-                    url = urljoin(source['url'], url)
-                
-                # Get snippet
-                snippet_elem = article.find(['p', 'div'], class_=lambda x: x and ('summary' in x.lower() or 'excerpt' in x.lower()))
-                snippet = snippet_elem.get_text(strip=True)[:500] if snippet_elem else ""
-                
-                # Get published date
-                time_elem = article.find('time')
-                published_at = None
-                if time_elem and time_elem.get('datetime'):
-                    try:
-                        published_at = datetime.fromisoformat(time_elem['datetime'].replace('Z', '+00:00'))
-                    except:
-                        pass
-                
-                if title and url:
-                    entry = {
-                        'title': title,
-                        'link': url,
-                        'summary': snippet,
-                        'published': published_at.isoformat() if published_at else None
-                    }
-                    self._process_entry(entry, source)
-                    
-        except Exception as e:
-            logger.error(f"Error scraping HTML {source['url']}: {e}")
+            # Get snippet
+            snippet_elem = selectors['snippet_selector'].select_one(article)
+            snippet = snippet_elem.get_text(strip=True)[:500] if snippet_elem else ""
+            
+            # Get published date
+            time_elem = article.find('time')
+            published_at = None
+            if time_elem and time_elem.get('datetime'):
+                try:
+                    published_at = datetime.fromisoformat(time_elem['datetime'].replace('Z', '+00:00'))
+                except:
+                    pass
+            
+            if title and url:
+                entry = {
+                    'title': title,
+                    'link': url,
+                    'summary': snippet,
+                    'published': published_at.isoformat() if published_at else None
+                }
+                raw_item = self._process_entry(entry, source)
+                if raw_item:
+                    raw_items.append(raw_item)
+        
+        return self._store_raw_items(raw_items, source)
     
-    def _process_entry(self, entry: Dict, source: Dict):
-        """Process a single entry and store as raw_item"""
+    def _process_entry(self, entry: Dict, source: Dict) -> Optional[Dict]:
+        """Build a raw_item record from a single entry"""
         url = entry.get('link') or entry.get('url', '')
         title = entry.get('title', '').strip()
         snippet = entry.get('summary') or entry.get('description', '').strip()
         
         if not url or not title:
-            return
+            return None
         
         # Generate hash for deduplication
         content_hash = hashlib.sha256(f"{url}{title}".encode()).hexdigest()
@@ -139,8 +340,7 @@ class Scraper:
         if not published_at:
             published_at = datetime.now(timezone.utc)
         
-        # Store raw item
-        raw_item = {
+        return {
             'source_id': source['id'],
             'url': url,
             'title': title,
@@ -149,8 +349,25 @@ class Scraper:
             'hash': content_hash,
             'status': 'NEW'
         }
+    
+    def _store_raw_items(self, raw_items: List[Dict], source: Dict) -> List[Dict]:
+        """Write a source's raw items in one bulk insert, returns the rows that were new"""
+        # Drop in-batch duplicates so each url is sent once
+        unique_items = list({item['url']: item for item in raw_items}.values())
+        
+        # Drop items seen recently before paying for a network write
+        unseen_items = [item for item in unique_items if not self.dedup_index.seen(item)]
+        if not unseen_items:
+            logger.info(f"Stored 0 new of {len(unique_items)} items from {source['name']} (all recently seen)")
+            return []
+        
+        inserted = self.db.insert_raw_items(unseen_items)
+        
+        # Rows that weren't inserted already exist in raw_items, so every item sent is now known
+        self.dedup_index.add(unseen_items)
         
-        item_id = self.db.insert_raw_item(raw_item)
-        if item_id:
-            logger.debug(f"Stored new raw item: {title[:50]}...")
+        for item in inserted:
+            logger.debug(f"Stored new raw item: {item['title'][:50]}...")
+        logger.info(f"Stored {len(inserted)} new of {len(unique_items)} items from {source['name']}")
+        return inserted
 
@@ -1,12 +1,12 @@
 """
 Script generation module
 """
-import os
 import logging
 import json
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from openai import OpenAI
 from modules.database import Database
+from modules.services import build_openai_client, openai_rate_limiter
 
 logger = logging.getLogger(__name__)
 
@@ -14,12 +14,13 @@ logger = logging.getLogger(__name__)
 class ScriptGenerator:
     """Generates scripts for stories"""
     
-    def __init__(self):
-        self.db = Database()
-        api_key = os.getenv('OPENAI_API_KEY')
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY must be set")
-        self.client = OpenAI(api_key=api_key)
+    CLAIM_BATCH_SIZE = 50  # QUEUED stories leased per run
+    ESTIMATED_COMPLETION_TOKENS = 500  # Reserved per script when rate limiting on tokens
+    
+    def __init__(self, db: Optional[Database] = None, client: Optional[OpenAI] = None):
+        self.db = db or Database()
+        self.client = client or build_openai_client()
+        self.rate_limiter = openai_rate_limiter()
         self.review_mode = self._get_review_mode()
     
     def _get_review_mode(self) -> bool:
@@ -29,11 +30,19 @@ class ScriptGenerator:
             return setting.get('enabled', False)
         return False
     
-    def process_queued_stories(self):
-        """Process queued stories and generate scripts"""
-        stories = self.db.get_queued_stories()
+    def process_queued_stories(self) -> int:
+        """Process queued stories and generate scripts, returns how many scripts are ready to render"""
+        stories = self.db.claim_queued_stories(self.CLAIM_BATCH_SIZE)
         logger.info(f"Processing {len(stories)} queued stories")
+        if not stories:
+            return 0
         
+        with self.db.leased('stories', [story['id'] for story in stories]):
+            return self._process_claimed(stories)
+    
+    def _process_claimed(self, stories: List[Dict]) -> int:
+        """Generate scripts for claimed stories, returns how many scripts are ready to render"""
+        ready = 0
         for story in stories:
             try:
                 # Get raw item for context
@@ -61,6 +70,7 @@ class ScriptGenerator:
                             }).execute()
                             logger.info(f"Added script to review queue: {story['id']}")
                         else:
+                            ready += 1
                             logger.info(f"Script generated and auto-approved: {story['id']}")
                 else:
                     self.db.update_story(story['id'], {
@@ -70,6 +80,10 @@ class ScriptGenerator:
                     
             except Exception as e:
                 logger.error(f"Error processing story {story['id']}: {e}", exc_info=True)
+                # Still QUEUED, so let the next run retry it
+                self.db.release_work('stories', [story['id']])
+        
+        return ready
     
     def _generate_script(self, story: Dict, raw_item: Dict) -> Optional[Dict]:
         """Generate script using AI"""
@@ -106,6 +120,8 @@ Return JSON format:
 }}"""
         
         try:
+            # Rough token estimate (~4 chars/token) plus the completion
+            self.rate_limiter.acquire(len(prompt) // 4 + self.ESTIMATED_COMPLETION_TOKENS)
             response = self.client.chat.completions.create(
                 model="gpt-4",
                 messages=[
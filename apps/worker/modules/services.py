@@ -0,0 +1,165 @@
+"""
+Worker-wide service container for long-lived API clients
+"""
+import os
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+from openai import OpenAI
+from modules.database import Database
+from modules.rate_limiter import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+# OpenAI account limits; one limiter per process so every caller and overlapping job shares the budget
+OPENAI_REQUESTS_PER_MINUTE = 200
+OPENAI_TOKENS_PER_MINUTE = 40000
+_openai_rate_limiter = RateLimiter(OPENAI_REQUESTS_PER_MINUTE, OPENAI_TOKENS_PER_MINUTE)
+
+
+def build_youtube_service(raise_errors: bool = False):
+    """Initialize YouTube API service, returns None if credentials aren't configured.
+    
+    Build errors are logged and return None too, unless `raise_errors` is set.
+    """
+    try:
+        client_id = os.getenv('YOUTUBE_CLIENT_ID')
+        client_secret = os.getenv('YOUTUBE_CLIENT_SECRET')
+        refresh_token = os.getenv('YOUTUBE_REFRESH_TOKEN')
+        
+        if not all([client_id, client_secret, refresh_token]):
+            logger.warning("YouTube credentials not configured")
+            return None
+        
+        creds = Credentials(
+            None,
+            refresh_token=refresh_token,
+            token_uri='https://oauth2.googleapis.com/token',
+            client_id=client_id,
+            client_secret=client_secret
+        )
+        
+        return build('youtube', 'v3', credentials=creds)
+    except Exception as e:
+        if raise_errors:
+            raise
+        logger.error(f"Error initializing YouTube service: {e}")
+        return None
+
+
+def build_openai_client() -> OpenAI:
+    """Initialize the OpenAI client"""
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY must be set")
+    return OpenAI(api_key=api_key)
+
+
+def openai_rate_limiter() -> RateLimiter:
+    """Get the process-wide OpenAI rate limiter"""
+    return _openai_rate_limiter
+
+
+class Services:
+    """Builds each client once, on first use, and shares it across scheduled jobs"""
+    
+    # Cheapest request that proves each client can still reach and authenticate with its API
+    HEALTH_CHECKS: Dict[str, Callable[[Any], Any]] = {
+        'db': lambda db: db.client.table('settings').select('key').limit(1).execute(),
+        'openai': lambda client: client.models.list(),
+        'youtube': lambda youtube: youtube.channels().list(part='id', mine=True).execute()  # 1 quota unit
+    }
+    
+    FACTORIES: Dict[str, Callable[[], Any]] = {
+        'db': Database,
+        'openai': build_openai_client,
+        # Raise build errors so a transient failure isn't cached as "not configured"
+        'youtube': lambda: build_youtube_service(raise_errors=True)
+    }
+    
+    # Failed builds are retried with exponential backoff
+    RETRY_BASE_SECONDS = 30
+    RETRY_MAX_SECONDS = 15 * 60
+    
+    def __init__(self):
+        self._instances: Dict[str, Any] = {}
+        self._failures: Dict[str, int] = {}
+        self._retry_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+    
+    @property
+    def db(self) -> Database:
+        return self._get('db')
+    
+    @property
+    def openai(self) -> OpenAI:
+        return self._get('openai')
+    
+    @property
+    def youtube(self):
+        """YouTube Data API client, or None if credentials aren't configured or it can't be built right now"""
+        try:
+            return self._get('youtube')
+        except Exception as e:
+            logger.error(f"YouTube client unavailable: {e}")
+            return None
+    
+    def _get(self, name: str) -> Any:
+        """Get a client, building it on first use; raises if the build fails or is backing off after a failure"""
+        with self._lock:
+            if name not in self._instances:
+                wait = self._retry_at.get(name, 0) - time.monotonic()
+                if wait > 0:
+                    raise RuntimeError(f"{name} client build failed, retrying in {wait:.0f}s")
+                started = time.monotonic()
+                try:
+                    self._instances[name] = self.FACTORIES[name]()
+                except Exception:
+                    failures = self._failures[name] = self._failures.get(name, 0) + 1
+                    delay = min(self.RETRY_BASE_SECONDS * 2 ** (failures - 1), self.RETRY_MAX_SECONDS)
+                    self._retry_at[name] = time.monotonic() + delay
+                    raise
+                self._failures.pop(name, None)
+                self._retry_at.pop(name, None)
+                logger.info(f"Built {name} client in {time.monotonic() - started:.2f}s")
+            return self._instances[name]
+    
+    def reset(self, name: Optional[str] = None):
+        """Drop one client (or all) so it is rebuilt on next use"""
+        with self._lock:
+            if name:
+                self._instances.pop(name, None)
+            else:
+                self._instances.clear()
+    
+    def check_health(self, *names: str) -> bool:
+        """Ping the named clients (all of them by default) and drop any that fail so they're rebuilt on next use"""
+        healthy = True
+        for name in names or tuple(self.HEALTH_CHECKS):
+            with self._lock:
+                built = name in self._instances
+                client = self._instances.get(name)
+                failed = name in self._failures
+            if not built:
+                if failed:
+                    # An earlier build failed; retry it once its backoff has passed
+                    try:
+                        self._get(name)
+                    except Exception as e:
+                        logger.warning(f"{name} client still unavailable: {e}")
+                        healthy = False
+                continue
+            if client is None:
+                # YouTube isn't configured
+                continue
+            try:
+                self.HEALTH_CHECKS[name](client)
+            except Exception as e:
+                logger.warning(f"{name} health check failed, reconnecting: {e}")
+                self.reset(name)
+                healthy = False
+        return healthy
+
@@ -0,0 +1,79 @@
+"""
+Per-source fetch scheduling with adaptive backoff
+"""
+import heapq
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SourceScheduler:
+    """Orders sources by next fetch time and computes backoff after each fetch"""
+    
+    DEFAULT_INTERVAL_MINUTES = 60
+    MAX_EMPTY_BACKOFF = 4  # Up to 4x the interval for sources that keep producing nothing new
+    MAX_FAILURE_BACKOFF = 16  # Up to 16x the interval for sources that keep failing
+    MAX_BACKOFF_MINUTES = 24 * 60
+    
+    def __init__(self, sources: List[Dict]):
+        # Min-heap on next fetch time; the index breaks ties without comparing dicts
+        self._queue = [(self.next_fetch_time(source), i, source) for i, source in enumerate(sources)]
+        heapq.heapify(self._queue)
+    
+    def due_sources(self, now: Optional[datetime] = None, limit: Optional[int] = None) -> List[Dict]:
+        """Pop sources whose next fetch time has passed, most overdue first"""
+        now = now or datetime.now(timezone.utc)
+        due = []
+        while self._queue and self._queue[0][0] <= now:
+            if limit is not None and len(due) >= limit:
+                break
+            due.append(heapq.heappop(self._queue)[2])
+        return due
+    
+    def next_fetch_time(self, source: Dict) -> datetime:
+        """Get when a source is next due"""
+        if source.get('next_fetch_at'):
+            return self._parse_time(source['next_fetch_at'])
+        if source.get('last_fetched_at'):
+            return self._parse_time(source['last_fetched_at']) + timedelta(minutes=self._interval(source))
+        # Never fetched
+        return datetime.min.replace(tzinfo=timezone.utc)
+    
+    def schedule_after_fetch(self, source: Dict, new_items: int, now: Optional[datetime] = None) -> Dict:
+        """Get source updates after a successful fetch, backing off sources with nothing new"""
+        now = now or datetime.now(timezone.utc)
+        empty_count = 0 if new_items else (source.get('empty_fetch_count') or 0) + 1
+        # First empty fetch keeps the base interval, then doubles
+        multiplier = min(2 ** max(empty_count - 1, 0), self.MAX_EMPTY_BACKOFF)
+        return {
+            'last_fetched_at': now.isoformat(),
+            'next_fetch_at': self._next_time(source, multiplier, now).isoformat(),
+            'empty_fetch_count': empty_count,
+            'failure_count': 0
+        }
+    
+    def schedule_after_failure(self, source: Dict, now: Optional[datetime] = None) -> Dict:
+        """Get source updates after a failed fetch, backing off exponentially"""
+        now = now or datetime.now(timezone.utc)
+        failure_count = (source.get('failure_count') or 0) + 1
+        multiplier = min(2 ** failure_count, self.MAX_FAILURE_BACKOFF)
+        logger.debug(f"Backing off {source.get('name')} {multiplier}x after {failure_count} failures")
+        return {
+            'next_fetch_at': self._next_time(source, multiplier, now).isoformat(),
+            'failure_count': failure_count
+        }
+    
+    def _next_time(self, source: Dict, multiplier: int, now: datetime) -> datetime:
+        """Get the next fetch time for an interval multiplier"""
+        minutes = min(self._interval(source) * multiplier, self.MAX_BACKOFF_MINUTES)
+        return now + timedelta(minutes=minutes)
+    
+    def _interval(self, source: Dict) -> int:
+        """Get a source's base fetch interval in minutes"""
+        return source.get('fetch_interval_minutes') or self.DEFAULT_INTERVAL_MINUTES
+    
+    def _parse_time(self, value: str) -> datetime:
+        """Parse a timestamp returned by Supabase"""
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
@@ -0,0 +1,150 @@
+"""
+Text overlay layers for video templates, rasterised once with Pillow
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+from PIL import Image, ImageDraw, ImageFont
+
+logger = logging.getLogger(__name__)
+
+
+class TextOverlay:
+    """Draws a template's static text into a transparent 1080x1920 PNG composited over the background.
+    
+    Text is wrapped to the frame width and each layer is pushed below the previous one if
+    wrapping makes it taller. Layers are cached by their content, so re-rendering the same
+    script reuses the PNG instead of laying the text out again.
+    """
+    
+    WIDTH = 1080
+    HEIGHT = 1920
+    MARGIN = 80
+    LINE_SPACING = 1.25
+    LAYER_GAP = 30
+    LAYOUT_VERSION = 1  # Bump when layout changes so cached overlays are redrawn
+    CACHE_MAX_AGE_HOURS = 24
+    
+    # Per template: which text goes where, top to bottom
+    TEMPLATES = {
+        # Template A: headline + stat
+        'A': [
+            {'field': 'hook', 'size': 60, 'color': '#ffffff', 'y': 200},
+            {'field': 'category', 'size': 40, 'color': '#888888', 'y': 300}
+        ],
+        # Template B: before/after
+        'B': [
+            {'field': 'what_happened', 'size': 50, 'color': '#ffffff', 'y': 400}
+        ],
+        # Template C: impact bullets
+        'C': [
+            {'field': 'why_it_matters', 'size': 45, 'color': '#ffffff', 'y': 500}
+        ]
+    }
+    
+    FONT_CANDIDATES = [
+        '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf',
+        '/usr/share/fonts/TTF/DejaVuSans-Bold.ttf',
+        '/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf'
+    ]
+    
+    _fonts: Dict[int, ImageFont.ImageFont] = {}
+    _fonts_lock = threading.Lock()
+    
+    def __init__(self, fonts_path: Path, cache_dir: Optional[str] = None):
+        self.font_path = self._find_font(fonts_path)
+        self.cache_dir = Path(cache_dir or os.getenv('RENDER_ASSET_CACHE_DIR')
+                              or Path(tempfile.gettempdir()) / 'orbix_render_assets') / 'overlays'
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+    
+    def render(self, template: str, texts: Dict[str, str]) -> Path:
+        """Get the overlay PNG for a template filled with `texts`, drawing it if it isn't cached"""
+        layers = self.TEMPLATES[template]
+        values = [str(texts.get(layer['field']) or '') for layer in layers]
+        key = json.dumps([self.LAYOUT_VERSION, template, values, self.font_path], ensure_ascii=False)
+        target = self.cache_dir / f"overlay-{hashlib.sha256(key.encode()).hexdigest()[:24]}.png"
+        if target.exists():
+            # Touch it so prune() keeps overlays that are still being reused
+            os.utime(target)
+            return target
+        
+        image = Image.new('RGBA', (self.WIDTH, self.HEIGHT), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(image)
+        bottom = 0
+        for layer, text in zip(layers, values):
+            font = self._font(layer['size'])
+            y = max(layer['y'], bottom + self.LAYER_GAP) if bottom else layer['y']
+            line_height = round(layer['size'] * self.LINE_SPACING)
+            for line in self._wrap(draw, text, font, self.WIDTH - 2 * self.MARGIN):
+                x = (self.WIDTH - draw.textlength(line, font=font)) / 2
+                draw.text((x, y), line, font=font, fill=layer['color'])
+                y += line_height
+            bottom = y
+        
+        # Write then rename so concurrent renders never read a partial file
+        tmp_path = target.with_name(f".{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        image.save(tmp_path, format='PNG')
+        os.replace(tmp_path, target)
+        return target
+    
+    def prune(self):
+        """Remove overlays not used within CACHE_MAX_AGE_HOURS"""
+        cutoff = time.time() - self.CACHE_MAX_AGE_HOURS * 3600
+        for path in self.cache_dir.glob('overlay-*.png'):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+    
+    def _wrap(self, draw: ImageDraw.ImageDraw, text: str, font: ImageFont.ImageFont, max_width: int) -> List[str]:
+        """Greedily wrap text into lines no wider than max_width, splitting words that don't fit on their own"""
+        lines = []
+        line = ''
+        for word in text.split():
+            candidate = f"{line} {word}" if line else word
+            if draw.textlength(candidate, font=font) <= max_width:
+                line = candidate
+                continue
+            if line:
+                lines.append(line)
+            # Hard-break words wider than a whole line
+            while draw.textlength(word, font=font) > max_width:
+                cut = len(word) - 1
+                while cut > 1 and draw.textlength(word[:cut], font=font) > max_width:
+                    cut -= 1
+                lines.append(word[:cut])
+                word = word[cut:]
+            line = word
+        if line:
+            lines.append(line)
+        return lines
+    
+    def _font(self, size: int) -> ImageFont.ImageFont:
+        """Get the overlay font at a size, loading each size once per process"""
+        with TextOverlay._fonts_lock:
+            if size not in TextOverlay._fonts:
+                if self.font_path:
+                    TextOverlay._fonts[size] = ImageFont.truetype(self.font_path, size)
+                else:
+                    TextOverlay._fonts[size] = ImageFont.load_default(size=size)
+            return TextOverlay._fonts[size]
+    
+    def _find_font(self, fonts_path: Path) -> Optional[str]:
+        """Get the font file: RENDER_FONT_PATH, then the first font in assets/fonts, then a common system font"""
+        configured = os.getenv('RENDER_FONT_PATH')
+        if configured:
+            return configured
+        bundled = sorted(p for p in fonts_path.glob('*') if p.suffix.lower() in ('.ttf', '.otf'))
+        if bundled:
+            return str(bundled[0])
+        system = next((path for path in self.FONT_CANDIDATES if os.path.exists(path)), None)
+        if not system:
+            logger.warning("No overlay font found, using Pillow's default font")
+        return system
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Worker modules are imported as `modules.*`, relative to apps/worker
+sys.path.insert(0, str(Path(__file__).parent.parent))
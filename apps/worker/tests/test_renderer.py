@@ -0,0 +1,66 @@
+"""
+Tests for the FFmpeg command built by the renderer
+"""
+from pathlib import Path
+import pytest
+from modules.renderer import Renderer
+
+
+class StubAssetCache:
+    """Returns a fixed prepared background, or None to take the unprepared path"""
+    
+    FPS = 30
+    
+    def __init__(self, prepared):
+        self.prepared = prepared
+    
+    def prepare(self, source):
+        return self.prepared
+    
+    def is_image(self, path):
+        return path.suffix == '.png'
+
+
+class StubTextOverlay:
+    def __init__(self, path):
+        self.path = path
+    
+    def render(self, template, texts):
+        return self.path
+
+
+def build_command(tmp_path: Path, bg_type: str, bg_id: str, prepared=None, create_background=True):
+    """Build a command on a Renderer wired to stubs instead of the database and caches"""
+    renderer = Renderer.__new__(Renderer)
+    renderer.assets_path = tmp_path
+    renderer.asset_cache = StubAssetCache(prepared)
+    renderer.text_overlay = StubTextOverlay(tmp_path / 'overlay.png')
+    renderer.ffmpeg_threads = 2
+    if create_background:
+        folder = tmp_path / 'backgrounds' / ('stills' if bg_type == 'STILL' else 'motion')
+        folder.mkdir(parents=True)
+        (folder / bg_id).write_bytes(b'')
+    
+    script = {'hook': 'Hook', 'what_happened': 'Happened', 'why_it_matters': 'Matters'}
+    story = {'category': 'Money & Market Shock'}
+    return renderer._build_ffmpeg_command(script, story, bg_type, bg_id, 'A', str(tmp_path / 'out.mp4'))
+
+
+@pytest.mark.parametrize('bg_type, bg_id, prepared_name, create_background', [
+    ('STILL', 'bg.jpg', 'bg.png', True),  # Prepared still, looped
+    ('MOTION', 'bg.mp4', 'bg-prepared.mp4', True),  # Prepared clip, stream-looped
+    ('STILL', 'bg.jpg', None, True),  # Unprepared still, scaled per frame
+    ('MOTION', 'bg.mp4', None, True),  # Unprepared clip, scaled per frame
+    ('STILL', 'missing.jpg', None, False),  # Solid color fallback
+])
+def test_duration_is_an_output_option(tmp_path, bg_type, bg_id, prepared_name, create_background):
+    prepared = tmp_path / prepared_name if prepared_name else None
+    cmd = build_command(tmp_path, bg_type, bg_id, prepared, create_background)
+    
+    last_input = max(i for i, arg in enumerate(cmd) if arg == '-i')
+    assert cmd.count('-t') == 1
+    duration = cmd.index('-t')
+    assert duration > last_input
+    assert cmd[duration + 1] == str(Renderer.VIDEO_SECONDS)
+    assert duration < cmd.index('-c:v')
+    assert cmd[-1] == str(tmp_path / 'out.mp4')
@@ -0,0 +1,19 @@
+-- Scripts ready for rendering
+-- Replaces the per-script review/render lookups in the worker with one set-based query
+
+CREATE INDEX IF NOT EXISTS idx_renders_script_id ON renders(script_id);
+CREATE INDEX IF NOT EXISTS idx_review_queue_script_id ON review_queue(script_id);
+CREATE INDEX IF NOT EXISTS idx_scripts_created_at ON scripts(created_at);
+
+-- Unrendered scripts whose story is APPROVED and whose review is APPROVED (or absent)
+CREATE OR REPLACE VIEW scripts_ready_for_render AS
+SELECT s.*
+FROM scripts s
+JOIN stories st ON st.id = s.story_id
+WHERE st.status = 'APPROVED'
+  AND NOT EXISTS (
+      SELECT 1 FROM renders r WHERE r.script_id = s.id
+  )
+  AND NOT EXISTS (
+      SELECT 1 FROM review_queue rq WHERE rq.script_id = s.id AND rq.status <> 'APPROVED'
+  );
@@ -0,0 +1,14 @@
+-- Renders ready for publishing
+-- Anti-join of COMPLETED renders against publishes so the worker fetches only unpublished renders
+
+CREATE INDEX IF NOT EXISTS idx_publishes_render_id ON publishes(render_id);
+CREATE INDEX IF NOT EXISTS idx_renders_completed_at ON renders(completed_at) WHERE render_status = 'COMPLETED';
+
+-- COMPLETED renders with no publish record on any platform
+CREATE OR REPLACE VIEW renders_ready_for_publish AS
+SELECT r.*
+FROM renders r
+WHERE r.render_status = 'COMPLETED'
+  AND NOT EXISTS (
+      SELECT 1 FROM publishes p WHERE p.render_id = r.id
+  );
@@ -0,0 +1,6 @@
+-- Conditional GET cache for sources
+-- Stores HTTP validators and a body hash so unchanged feeds/pages are not re-parsed
+
+ALTER TABLE sources ADD COLUMN IF NOT EXISTS etag TEXT;
+ALTER TABLE sources ADD COLUMN IF NOT EXISTS last_modified TEXT;
+ALTER TABLE sources ADD COLUMN IF NOT EXISTS content_hash TEXT;
@@ -0,0 +1,8 @@
+-- Per-source fetch scheduling
+-- next_fetch_at is computed by the worker from fetch_interval_minutes plus adaptive backoff
+
+ALTER TABLE sources ADD COLUMN IF NOT EXISTS next_fetch_at TIMESTAMPTZ;
+ALTER TABLE sources ADD COLUMN IF NOT EXISTS failure_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE sources ADD COLUMN IF NOT EXISTS empty_fetch_count INTEGER NOT NULL DEFAULT 0;
+
+CREATE INDEX IF NOT EXISTS idx_sources_next_fetch_at ON sources(next_fetch_at) WHERE enabled = true;
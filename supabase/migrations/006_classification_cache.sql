@@ -0,0 +1,13 @@
+-- Classification cache
+-- Reuses GPT classification verdicts for syndicated items with the same normalised title+snippet
+
+CREATE TABLE IF NOT EXISTS classification_cache (
+    content_hash TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    model TEXT NOT NULL,
+    result_json JSONB NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (content_hash, prompt_version, model)
+);
+
+CREATE INDEX IF NOT EXISTS idx_classification_cache_created_at ON classification_cache(created_at);
@@ -0,0 +1,6 @@
+-- Batched classification
+-- Number of raw items the classifier sends per AI request (1 disables batching)
+
+INSERT INTO settings (key, value) VALUES
+    ('classification_batch_size', '{"value": 5}'::jsonb)
+ON CONFLICT (key) DO NOTHING;
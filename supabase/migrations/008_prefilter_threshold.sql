@@ -0,0 +1,6 @@
+-- Local pre-filter
+-- Items scoring below this (0-1) are discarded before AI classification; 0 disables the pre-filter
+
+INSERT INTO settings (key, value) VALUES
+    ('prefilter_threshold', '{"value": 0.05}'::jsonb)
+ON CONFLICT (key) DO NOTHING;
@@ -0,0 +1,7 @@
+-- Near-duplicate clustering
+-- Raw items collapsed into another item's cluster point at the representative that was classified
+
+ALTER TABLE raw_items ADD COLUMN IF NOT EXISTS duplicate_of UUID REFERENCES raw_items(id) ON DELETE SET NULL;
+
+CREATE INDEX IF NOT EXISTS idx_raw_items_duplicate_of ON raw_items(duplicate_of) WHERE duplicate_of IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_raw_items_status_created_at ON raw_items(status, created_at);
@@ -0,0 +1,7 @@
+-- Per-source HTML extraction selectors
+-- CSS selectors used by the scraper for HTML sources; NULL falls back to the worker's defaults
+
+ALTER TABLE sources ADD COLUMN IF NOT EXISTS article_selector TEXT;
+ALTER TABLE sources ADD COLUMN IF NOT EXISTS title_selector TEXT;
+ALTER TABLE sources ADD COLUMN IF NOT EXISTS link_selector TEXT;
+ALTER TABLE sources ADD COLUMN IF NOT EXISTS snippet_selector TEXT;
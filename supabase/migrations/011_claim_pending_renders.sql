@@ -0,0 +1,21 @@
+-- Atomic render claiming
+-- Lets several render workers (threads or replicas) pull PENDING renders without taking the same row twice
+
+CREATE INDEX IF NOT EXISTS idx_renders_pending_created_at ON renders(created_at) WHERE render_status = 'PENDING';
+
+-- Flip up to batch_size of the oldest PENDING renders to PROCESSING and return them
+CREATE OR REPLACE FUNCTION claim_pending_renders(batch_size INTEGER)
+RETURNS SETOF renders
+LANGUAGE sql
+AS $$
+    UPDATE renders
+    SET render_status = 'PROCESSING'
+    WHERE id IN (
+        SELECT id FROM renders
+        WHERE render_status = 'PENDING'
+        ORDER BY created_at
+        LIMIT batch_size
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING *;
+$$;
@@ -0,0 +1,104 @@
+-- Leased work claiming
+-- Lets several worker replicas share every pipeline stage: a claimed row is skipped by other workers until its
+-- lease expires, and rows left claimed by a crashed worker become claimable again once the lease runs out
+
+ALTER TABLE raw_items ADD COLUMN IF NOT EXISTS claimed_by TEXT;
+ALTER TABLE raw_items ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMPTZ;
+ALTER TABLE stories ADD COLUMN IF NOT EXISTS claimed_by TEXT;
+ALTER TABLE stories ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMPTZ;
+ALTER TABLE renders ADD COLUMN IF NOT EXISTS claimed_by TEXT;
+ALTER TABLE renders ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMPTZ;
+ALTER TABLE publishes ADD COLUMN IF NOT EXISTS claimed_by TEXT;
+ALTER TABLE publishes ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMPTZ;
+
+CREATE INDEX IF NOT EXISTS idx_stories_status_created_at ON stories(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_renders_status_created_at ON renders(render_status, created_at);
+CREATE INDEX IF NOT EXISTS idx_publishes_status_created_at ON publishes(publish_status, created_at);
+
+-- Superseded by claim_work
+DROP FUNCTION IF EXISTS claim_pending_renders(INTEGER);
+DROP INDEX IF EXISTS idx_renders_pending_created_at;
+
+CREATE OR REPLACE FUNCTION assert_claimable_table(target TEXT)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF target NOT IN ('raw_items', 'stories', 'renders', 'publishes') THEN
+        RAISE EXCEPTION 'Table % does not support work claiming', target;
+    END IF;
+END;
+$$;
+
+-- Lease up to batch_size of the oldest rows of `target` whose status_column is from_status (or to_status with an
+-- expired lease), optionally restricted to ids in the `candidates` view, moving them to to_status if given
+CREATE OR REPLACE FUNCTION claim_work(
+    target TEXT,
+    status_column TEXT,
+    from_status TEXT,
+    to_status TEXT,
+    worker TEXT,
+    batch_size INTEGER,
+    lease_seconds INTEGER,
+    order_column TEXT DEFAULT 'created_at',
+    candidates TEXT DEFAULT NULL
+)
+RETURNS SETOF JSONB
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM assert_claimable_table(target);
+    IF candidates IS NOT NULL AND candidates NOT IN ('renders_ready_for_publish') THEN
+        RAISE EXCEPTION 'View % is not a claim candidate view', candidates;
+    END IF;
+
+    RETURN QUERY EXECUTE format(
+        'UPDATE %1$I t
+         SET %2$I = COALESCE($2, t.%2$I), claimed_by = $3, lease_expires_at = NOW() + make_interval(secs => $5)
+         WHERE t.id IN (
+             SELECT c.id FROM %1$I c
+             WHERE ((c.%2$I = $1 AND (c.lease_expires_at IS NULL OR c.lease_expires_at < NOW()))
+                    OR ($2 IS NOT NULL AND c.%2$I = $2 AND c.lease_expires_at < NOW()))
+               %4$s
+             ORDER BY c.%3$I
+             LIMIT $4
+             FOR UPDATE SKIP LOCKED
+         )
+         RETURNING to_jsonb(t.*)',
+        target, status_column, order_column,
+        CASE WHEN candidates IS NULL THEN '' ELSE format('AND c.id IN (SELECT id FROM %I)', candidates) END
+    ) USING from_status, to_status, worker, batch_size, lease_seconds;
+END;
+$$;
+
+-- Extend the lease on rows still held by `worker`, returns how many were extended
+CREATE OR REPLACE FUNCTION heartbeat_work(target TEXT, ids UUID[], worker TEXT, lease_seconds INTEGER)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    extended INTEGER;
+BEGIN
+    PERFORM assert_claimable_table(target);
+    EXECUTE format(
+        'UPDATE %I SET lease_expires_at = NOW() + make_interval(secs => $3) WHERE id = ANY($1) AND claimed_by = $2',
+        target
+    ) USING ids, worker, lease_seconds;
+    GET DIAGNOSTICS extended = ROW_COUNT;
+    RETURN extended;
+END;
+$$;
+
+-- Drop the lease on rows held by `worker` so they can be claimed again straight away
+CREATE OR REPLACE FUNCTION release_work(target TEXT, ids UUID[], worker TEXT)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM assert_claimable_table(target);
+    EXECUTE format(
+        'UPDATE %I SET claimed_by = NULL, lease_expires_at = NULL WHERE id = ANY($1) AND claimed_by = $2',
+        target
+    ) USING ids, worker;
+END;
+$$;
@@ -0,0 +1,4 @@
+-- Render output checksum
+-- Lets the publisher find a render in its local artifact cache and verify a re-downloaded copy
+
+ALTER TABLE renders ADD COLUMN IF NOT EXISTS output_sha256 TEXT;
@@ -0,0 +1,7 @@
+-- Resumable YouTube uploads
+-- A publish row is created as UPLOADING before the upload starts and keeps the upload session, so a later run
+-- can resume an interrupted upload from the last acknowledged byte instead of starting over
+
+ALTER TABLE publishes ADD COLUMN IF NOT EXISTS upload_uri TEXT;
+ALTER TABLE publishes ADD COLUMN IF NOT EXISTS upload_offset BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE publishes ADD COLUMN IF NOT EXISTS upload_attempts INTEGER NOT NULL DEFAULT 0;
@@ -0,0 +1,97 @@
+-- Daily publish cap accounting
+-- One counter row per channel-local day; publishers claim cap slots from it atomically so concurrent workers
+-- can't overshoot daily_video_cap. A video takes a slot when its publish rows are created and gives it back
+-- if every platform fails.
+
+CREATE TABLE IF NOT EXISTS daily_publish_counts (
+    day DATE PRIMARY KEY,
+    used INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_publishes_created_at ON publishes(created_at);
+
+INSERT INTO settings (key, value) VALUES
+    ('channel_timezone', '{"value": "UTC"}'::jsonb)
+ON CONFLICT (key) DO NOTHING;
+
+-- Create the day's counter on first use, seeded from videos whose publishes were created during the day
+CREATE OR REPLACE FUNCTION ensure_daily_publish_count(target_day DATE, day_start TIMESTAMPTZ, day_end TIMESTAMPTZ)
+RETURNS VOID
+LANGUAGE sql
+AS $$
+    INSERT INTO daily_publish_counts (day, used)
+    SELECT target_day, COUNT(DISTINCT p.render_id)
+    FROM publishes p
+    WHERE p.created_at >= day_start
+      AND p.created_at < day_end
+      AND p.publish_status <> 'FAILED'
+    ON CONFLICT (day) DO NOTHING;
+$$;
+
+-- Get how many of the day's slots are taken
+CREATE OR REPLACE FUNCTION publish_slots_used(target_day DATE, day_start TIMESTAMPTZ, day_end TIMESTAMPTZ)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM ensure_daily_publish_count(target_day, day_start, day_end);
+    RETURN (SELECT used FROM daily_publish_counts WHERE day = target_day);
+END;
+$$;
+
+-- Take up to `wanted` of the day's remaining slots under `cap`, returns how many were granted
+CREATE OR REPLACE FUNCTION claim_publish_slots(target_day DATE, day_start TIMESTAMPTZ, day_end TIMESTAMPTZ,
+                                               cap INTEGER, wanted INTEGER)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    current_used INTEGER;
+    granted INTEGER;
+BEGIN
+    PERFORM ensure_daily_publish_count(target_day, day_start, day_end);
+    SELECT used INTO current_used FROM daily_publish_counts WHERE day = target_day FOR UPDATE;
+    granted := GREATEST(LEAST(wanted, cap - current_used), 0);
+    UPDATE daily_publish_counts SET used = used + granted, updated_at = NOW() WHERE day = target_day;
+    RETURN granted;
+END;
+$$;
+
+-- Give back slots that were claimed but not used
+CREATE OR REPLACE FUNCTION release_publish_slots(target_day DATE, released INTEGER)
+RETURNS VOID
+LANGUAGE sql
+AS $$
+    UPDATE daily_publish_counts
+    SET used = GREATEST(used - released, 0), updated_at = NOW()
+    WHERE day = target_day;
+$$;
+
+-- Mark a publish FAILED; if it was the render's last publish still live, give the slot back to `target_day`.
+-- Returns whether the slot was released.
+CREATE OR REPLACE FUNCTION fail_publish(target_id UUID, attempts INTEGER, target_day DATE)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    target_render UUID;
+BEGIN
+    UPDATE publishes
+    SET publish_status = 'FAILED', upload_attempts = attempts, claimed_by = NULL, lease_expires_at = NULL
+    WHERE id = target_id AND publish_status <> 'FAILED'
+    RETURNING render_id INTO target_render;
+    IF target_render IS NULL THEN
+        RETURN FALSE;
+    END IF;
+
+    -- Serialise failures of the same render's publishes so exactly one of them sees no live publish left
+    PERFORM 1 FROM renders WHERE id = target_render FOR UPDATE;
+    IF EXISTS (SELECT 1 FROM publishes WHERE render_id = target_render AND publish_status <> 'FAILED') THEN
+        RETURN FALSE;
+    END IF;
+
+    PERFORM release_publish_slots(target_day, 1);
+    RETURN TRUE;
+END;
+$$;